@@ -2,7 +2,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-from app.services.generators import generate_flashcards_llm
+from app.services.generators import generate_flashcards_llm, stream_flashcards_llm
+from app.api.sse import sse_response
 
 router = APIRouter()
 
@@ -13,12 +14,24 @@ class FlashCardRequest(BaseModel):
     studyKitId: Optional[str] = None
     topics: Optional[List[str]] = None
     use_retriever: bool = True
+    stream: bool = False
 
 @router.post("/create")
 async def create_flashcard_endpoint(req: FlashCardRequest):
     """
     Endpoint to create flashcards based on topic, studyKit, or explicit topics.
+    With stream=true each flashcard is sent as a server-sent "item" event as soon as
+    it is generated, followed by "done" with the validated set.
     """
+    if req.stream:
+        return sse_response(stream_flashcards_llm(
+            topic=req.topic,
+            n=req.num_flashcards,
+            provider=req.provider,
+            topics=req.topics,
+            studyKitId=req.studyKitId,
+            use_retriever=req.use_retriever
+        ))
     try:
         flashcard_result = await generate_flashcards_llm(
             topic=req.topic,
@@ -1,8 +1,12 @@
 # app/api/ingestion.py
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from app.services.ingestion_manager import ingestion_manager
+from app.services.job_queue import job_queue
+from app.services import ingestion_status
+from app.services.ingest_worker import JOB_PENDING, JOB_STUDY_KIT
 
 router = APIRouter()
 
@@ -15,6 +19,7 @@ class StudyKitIngestRequest(BaseModel):
     studyKitId: str
     max_concurrency: Optional[int] = 5
     collection_name: Optional[str] = None
+    reingest: bool = False  # re-run processed sources; only changed chunks are re-embedded
 
 @router.post("/ingest/pending")
 async def ingest_pending_sources(req: IngestRequest):
@@ -46,69 +51,76 @@ async def ingest_study_kit_sources(req: StudyKitIngestRequest):
             
         result = await ingestion_manager.ingest_study_kit_sources(
             studyKitId=req.studyKitId,
-            max_concurrency=req.max_concurrency
+            max_concurrency=req.max_concurrency,
+            reingest=req.reingest
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Study kit ingestion failed: {str(e)}")
 
 @router.post("/ingest/background/pending")
-async def ingest_pending_sources_background(background_tasks: BackgroundTasks, req: IngestRequest):
+async def ingest_pending_sources_background(req: IngestRequest):
     """
-    Process pending sources in the background and return immediately.
+    Queue an ingestion job for pending sources and return its id immediately.
+    The job runs in the ingest worker pool (python -m app.services.ingest_worker).
     """
     try:
-        async def run_ingestion():
-            if req.collection_name:
-                ingestion_manager.collection_name = req.collection_name
-            await ingestion_manager.ingest_pending_sources(
-                limit=req.limit,
-                max_concurrency=req.max_concurrency
-            )
-        
-        background_tasks.add_task(run_ingestion)
-        return {"message": "Ingestion started in background", "status": "accepted"}
+        job = await asyncio.to_thread(job_queue.enqueue, JOB_PENDING, req.dict())
+        return {"message": "Ingestion job queued", "job_id": job["id"], "status": job["status"]}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to start background ingestion: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue ingestion job: {str(e)}")
 
 @router.post("/ingest/background/study-kit")
-async def ingest_study_kit_background(background_tasks: BackgroundTasks, req: StudyKitIngestRequest):
+async def ingest_study_kit_background(req: StudyKitIngestRequest):
     """
-    Process study kit sources in the background.
+    Queue an ingestion job for a study kit's sources.
     """
     try:
-        async def run_ingestion():
-            if req.collection_name:
-                ingestion_manager.collection_name = req.collection_name
-            await ingestion_manager.ingest_study_kit_sources(
-                studyKitId=req.studyKitId,
-                max_concurrency=req.max_concurrency
-            )
-        
-        background_tasks.add_task(run_ingestion)
+        job = await asyncio.to_thread(job_queue.enqueue, JOB_STUDY_KIT, req.dict())
         return {
-            "message": f"Study kit ingestion started in background",
+            "message": "Study kit ingestion job queued",
             "studyKitId": req.studyKitId,
-            "status": "accepted"
+            "job_id": job["id"],
+            "status": job["status"]
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to start background ingestion: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue ingestion job: {str(e)}")
+
+@router.get("/ingest/jobs")
+async def list_ingestion_jobs(status: Optional[str] = None, limit: int = 50):
+    """
+    Most recent ingestion jobs, optionally filtered by status.
+    """
+    jobs = await asyncio.to_thread(job_queue.list, status, limit)
+    return {"jobs": jobs, "counts": await asyncio.to_thread(job_queue.counts)}
+
+@router.get("/ingest/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """
+    Status, progress (sources done, chunks embedded) and result of one ingestion job.
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@router.post("/ingest/jobs/{job_id}/cancel")
+async def cancel_ingestion_job(job_id: str):
+    """
+    Cancel a job. A queued job never runs; a running one stops at its next heartbeat.
+    """
+    job = await asyncio.to_thread(job_queue.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
 
 @router.get("/ingest/status")
-async def get_ingestion_status():
+async def get_ingestion_status(studyKitId: Optional[str] = None, by_kit: bool = False):
     """
-    Get the current status of unprocessed sources.
+    Source counts, in-progress leases, queue depth and recent ingestion rate.
+    Optionally scoped to one study kit and/or broken down per kit. Cached for a few seconds.
     """
     try:
-        from app.db.supabase_client import fetch_unprocessed_sources, fetch_processed_sources
-        
-        unprocessed = fetch_unprocessed_sources(limit=1000)  # Get count
-        processed = fetch_processed_sources()
-        
-        return {
-            "unprocessed_count": len(unprocessed),
-            "processed_count": len(processed),
-            "total_sources": len(unprocessed) + len(processed)
-        }
+        return await ingestion_status.get_ingestion_status(studyKitId=studyKitId, by_kit=by_kit)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get status: {str(e)}")
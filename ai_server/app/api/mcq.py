@@ -2,7 +2,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-from app.services.generators import generate_mcqs_llm
+from app.services.generators import generate_mcqs_llm, stream_mcqs_llm
+from app.api.sse import sse_response
 
 router = APIRouter()
 
@@ -14,13 +15,25 @@ class MCQRequest(BaseModel):
     topics: Optional[List[str]] = None
     use_retriever: bool = True
     collection_name: Optional[str] = None
+    stream: bool = False
 
 @router.post("/create")
 async def create_mcqs(req: MCQRequest):
     """
     Endpoint to create MCQs based on topic, studyKit, or explicit topics list.
     Priority: explicit topics > studyKitId extraction > single topic
+    With stream=true each MCQ is sent as a server-sent "item" event as soon as
+    it is generated, followed by "done" with the validated set.
     """
+    if req.stream:
+        return sse_response(stream_mcqs_llm(
+            topic=req.topic,
+            n=req.num_questions,
+            provider=req.provider,
+            topics=req.topics,
+            studyKitId=req.studyKitId,
+            use_retriever=req.use_retriever
+        ))
     try:
         mcq_result = await generate_mcqs_llm(
             topic=req.topic,
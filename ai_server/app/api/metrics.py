@@ -0,0 +1,76 @@
+# app/api/metrics.py
+from fastapi import APIRouter
+from app.services.http_client import http_client
+from app.services.text_cache import text_cache
+from app.services.topic_cache import topic_cache
+from app.services.llm_cache import llm_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_writer import embedding_writer
+from app.services.status_writer import status_writer
+from app.services.lexical_index import lexical_index
+from app.services.reranker import reranker
+
+router = APIRouter()
+
+@router.get("/http")
+async def http_pool_metrics():
+    """
+    Connection pool metrics for the shared HTTP client (connections reused vs. opened).
+    """
+    return http_client.get_metrics()
+
+@router.get("/text-cache")
+async def text_cache_metrics():
+    """
+    Hit/miss counters and disk usage of the extracted-text cache.
+    """
+    return text_cache.get_metrics()
+
+@router.get("/topic-cache")
+async def topic_cache_metrics():
+    """
+    Hit/miss counters of the per-study-kit topic cache.
+    """
+    return topic_cache.get_metrics()
+
+@router.get("/llm-cache")
+async def llm_cache_metrics():
+    """
+    Hit/miss counters of the LLM response cache.
+    """
+    return llm_cache.get_metrics()
+
+@router.get("/embedding-cache")
+async def embedding_cache_metrics():
+    """
+    Hit/miss counters and per-model sizes of the embedding cache.
+    """
+    return embedding_cache.get_metrics()
+
+@router.get("/embedding-writer")
+async def embedding_writer_metrics():
+    """
+    Flush and embedding-call counters of the batched embedding writer.
+    """
+    return embedding_writer.get_metrics()
+
+@router.get("/status-writer")
+async def status_writer_metrics():
+    """
+    Marks written vs. requests sent by the batched source status writer.
+    """
+    return status_writer.get_metrics()
+
+@router.get("/lexical-index")
+async def lexical_index_metrics():
+    """
+    Segment and document counts of the BM25 index, per open collection.
+    """
+    return lexical_index.get_metrics()
+
+@router.get("/reranker")
+async def reranker_metrics():
+    """
+    Re-ranked vs fallback (budget exceeded) counts and average scoring time.
+    """
+    return reranker.get_metrics()
@@ -1,6 +1,7 @@
 from fastapi import APIRouter , HTTPException
 from pydantic import BaseModel 
-from app.services.generators import rag_chat_with_retriever_only
+from app.services.generators import rag_chat_with_retriever_only, stream_rag_chat
+from app.api.sse import sse_response
 from typing import Optional
 
 router = APIRouter()
@@ -10,6 +11,8 @@ class RAGRequest(BaseModel):
     provider: Optional[str] = "openai"
     collection: Optional[str] = None
     k: Optional[int] = 4
+    studyKitId: Optional[str] = None
+    stream: bool = False
 
 
 @router.post("/chat")
@@ -17,13 +20,24 @@ async def chat_rag(req: RAGRequest):
 
     """
     Endpoint to handle RAG chatbot queries.
+    With stream=true the answer is sent as server-sent events:
+    sources, delta (answer text), then done with the validated response.
     """
+    if req.stream:
+        return sse_response(stream_rag_chat(
+            query=req.query,
+            provider=req.provider,
+            k=req.k,
+            collection=req.collection,
+            studyKitId=req.studyKitId
+        ))
     try:
         response = await rag_chat_with_retriever_only(
             query=req.query,
             provider=req.provider,
             k=req.k,
-            collection=req.collection
+            collection=req.collection,
+            studyKitId=req.studyKitId
         )
         return response
     except Exception as e:
@@ -0,0 +1,33 @@
+# app/api/sse.py
+import json
+import logging
+from typing import Any, AsyncIterator, Tuple
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event; data is sent as a single line of JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """
+    Stream (event, data) pairs as text/event-stream. The status line is already
+    sent when a generator fails, so errors arrive as an "error" event instead of a 500.
+    """
+    async def body():
+        try:
+            async for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Streaming response failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        # Keep proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,19 +1,24 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from app.services.generators import summarize_llm
+from app.services.generators import summarize_llm, stream_summarize_llm
+from app.api.sse import sse_response
 
 router = APIRouter()
 
 class SummarizeRequest(BaseModel):
     text: str
     provider: str = "openai"
+    stream: bool = False
 
 
 @router.post("/")
 async def summarize_endpoint(req: SummarizeRequest):
     """
     Endpoint to create summarize based on the provided context.
+    With stream=true the summary text is sent as server-sent events (delta, then done).
     """
+    if req.stream:
+        return sse_response(stream_summarize_llm(text=req.text, provider=req.provider))
     try:
         summary_response = await summarize_llm(
             text=req.text,
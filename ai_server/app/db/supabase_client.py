@@ -1,6 +1,8 @@
 # app/db/supabase_client.py
 import os
-from typing import List, Dict, Optional
+import asyncio
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Sequence
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -19,7 +21,23 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
 # supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
-def fetch_unprocessed_sources(limit: int = 50) -> List[Dict]:
+# Columns the AI server reads from Source; callers that need less pass their own projection
+SOURCE_COLUMNS = ("id", "studyKitId", "fileUrl", "fileName", "fileType", "fileSize", "processed", "loaderUsed")
+# Rows per request when paging through Source (keyset pagination on id)
+SOURCE_PAGE_SIZE = int(os.getenv("SOURCE_PAGE_SIZE", "500"))
+# Ids per bulk "processed" update
+MARK_BATCH_SIZE = int(os.getenv("MARK_BATCH_SIZE", "200"))
+
+def _select(columns: Sequence[str]) -> str:
+    # Keyset pagination needs the id of the last row
+    return ",".join(columns if "id" in columns else ("id", *columns))
+
+def utc_timestamp(dt: Optional[datetime] = None) -> str:
+    """ISO timestamp for Prisma's TIMESTAMP(3) columns, which hold naive UTC times"""
+    dt = dt or datetime.now(timezone.utc)
+    return dt.astimezone(timezone.utc).replace(tzinfo=None).isoformat(timespec="milliseconds")
+
+def fetch_unprocessed_sources(limit: int = 50, columns: Sequence[str] = SOURCE_COLUMNS) -> List[Dict]:
     """
     Fetch unprocessed Source records from Supabase.
     Returns list of dictionaries with source data.
@@ -27,8 +45,9 @@ def fetch_unprocessed_sources(limit: int = 50) -> List[Dict]:
     try:
         response = (
             supabase.table("Source")
-            .select("*")
+            .select(_select(columns))
             .eq("processed", False)
+            .order("id")
             .limit(limit)
             .execute()
         )
@@ -36,63 +55,246 @@ def fetch_unprocessed_sources(limit: int = 50) -> List[Dict]:
     except Exception as e:
         raise RuntimeError(f"Failed to fetch unprocessed sources: {e}")
 
-def fetch_processed_sources(studyKitId: Optional[str] = None) -> List[Dict]:
+def claim_sources(
+    owner: str,
+    limit: int = 50,
+    lease_seconds: int = 300,
+    studyKitId: Optional[str] = None,
+    include_processed: bool = False
+) -> List[Dict]:
+    """
+    Atomically lease up to `limit` unprocessed Source rows to `owner` for
+    `lease_seconds`. Rows leased by another owner are skipped until their lease
+    expires, so concurrent workers and replicas never receive the same row.
+    At most SOURCE_PAGE_SIZE rows are leased per call (rows past PostgREST's
+    max-rows would be leased but never returned); rows carry SOURCE_COLUMNS.
+    """
+    try:
+        response = supabase.rpc("claim_sources", {
+            "p_owner": owner,
+            "p_limit": min(limit, SOURCE_PAGE_SIZE),
+            "p_lease_seconds": int(lease_seconds),
+            "p_study_kit_id": studyKitId,
+            "p_include_processed": include_processed,
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        raise RuntimeError(f"Failed to claim sources: {e}")
+
+def renew_source_leases(owner: str, source_ids: List[str], lease_seconds: int = 300) -> List[str]:
+    """
+    Extend owner's leases. Returns the ids still held (a lease that expired and
+    was claimed by someone else is not returned).
+    """
+    if not source_ids:
+        return []
+    try:
+        response = supabase.rpc("renew_source_leases", {
+            "p_owner": owner,
+            "p_ids": source_ids,
+            "p_lease_seconds": int(lease_seconds),
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        raise RuntimeError(f"Failed to renew source leases: {e}")
+
+def release_source_leases(owner: str, source_ids: List[str]) -> List[str]:
+    """
+    Release owner's leases so the rows can be claimed again right away.
+    """
+    if not source_ids:
+        return []
+    try:
+        response = supabase.rpc("release_source_leases", {
+            "p_owner": owner,
+            "p_ids": source_ids,
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        raise RuntimeError(f"Failed to release source leases: {e}")
+
+def fetch_source_page(
+    columns: Sequence[str] = SOURCE_COLUMNS,
+    studyKitId: Optional[str] = None,
+    processed: Optional[bool] = None,
+    after_id: Optional[str] = None,
+    page_size: int = SOURCE_PAGE_SIZE
+) -> List[Dict]:
+    """
+    One page of Source rows ordered by id, starting after `after_id` (keyset pagination:
+    every page is an index range scan, however deep into the table it is).
+    """
+    query = supabase.table("Source").select(_select(columns))
+    if studyKitId:
+        query = query.eq("studyKitId", studyKitId)
+    if processed is not None:
+        query = query.eq("processed", processed)
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    response = query.order("id").limit(page_size).execute()
+    return response.data or []
+
+def iter_source_pages(
+    columns: Sequence[str] = SOURCE_COLUMNS,
+    studyKitId: Optional[str] = None,
+    processed: Optional[bool] = None,
+    page_size: int = SOURCE_PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Yield pages of Source rows until the filter is exhausted.
+    """
+    after_id = None
+    while True:
+        page = fetch_source_page(columns, studyKitId, processed, after_id, page_size)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+async def stream_source_pages(
+    columns: Sequence[str] = SOURCE_COLUMNS,
+    studyKitId: Optional[str] = None,
+    processed: Optional[bool] = None,
+    page_size: int = SOURCE_PAGE_SIZE
+) -> AsyncIterator[List[Dict]]:
+    """
+    Async version of iter_source_pages. The next page is fetched while the caller
+    works on the current one, so at most two pages are held in memory.
+    """
+    after_id = None
+    pending = asyncio.ensure_future(
+        asyncio.to_thread(fetch_source_page, columns, studyKitId, processed, after_id, page_size)
+    )
+    try:
+        while pending is not None:
+            page = await pending
+            pending = None
+            if len(page) == page_size:
+                after_id = page[-1]["id"]
+                pending = asyncio.ensure_future(
+                    asyncio.to_thread(fetch_source_page, columns, studyKitId, processed, after_id, page_size)
+                )
+            if page:
+                yield page
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch sources: {e}")
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+def fetch_processed_sources(studyKitId: Optional[str] = None, columns: Sequence[str] = SOURCE_COLUMNS) -> List[Dict]:
     """
     Fetch processed Source records, optionally filtered by studyKitId.
+    Paged, so kits beyond the API's row limit are returned in full.
     """
     try:
-        query = supabase.table("Source").select("*").eq("processed", True)
-        
-        if studyKitId:
-            query = query.eq("studyKitId", studyKitId)
-            
-        response = query.execute()
-        return response.data
+        return [row for page in iter_source_pages(columns, studyKitId, processed=True) for row in page]
     except Exception as e:
         raise RuntimeError(f"Failed to fetch processed sources: {e}")
 
-def mark_source_processed(source_id: str, loader_used: str = None) -> bool:
+def mark_sources_processed(source_ids: List[str], loader_used: str = None, owner: Optional[str] = None) -> int:
     """
-    Mark a source as processed in the database.
+    Mark sources as processed with one update per MARK_BATCH_SIZE ids.
+    With owner, only rows still leased to owner are updated, so a row whose lease
+    expired and was claimed by another worker keeps that worker's lease.
+    Returns the number of rows updated.
     """
+    if not source_ids:
+        return 0
     try:
-        update_data = {"processed": True}
+        # Processing is done, so the rows' leases (if any) are cleared with the same write
+        update_data = {"processed": True, "processedAt": utc_timestamp(), "leaseOwner": None, "leaseExpiresAt": None}
         if loader_used:
             update_data["loaderUsed"] = loader_used
-            
-        response = (
-            supabase.table("Source")
-            .update(update_data)
-            .eq("id", source_id)
-            .execute()
-        )
-        return len(response.data) > 0
+
+        updated = 0
+        # The id list goes into the request URL, so keep each request bounded
+        for start in range(0, len(source_ids), MARK_BATCH_SIZE):
+            query = (
+                supabase.table("Source")
+                .update(update_data)
+                .in_("id", source_ids[start:start + MARK_BATCH_SIZE])
+            )
+            if owner is not None:
+                query = query.eq("leaseOwner", owner)
+            response = query.execute()
+            updated += len(response.data or [])
+        return updated
     except Exception as e:
-        raise RuntimeError(f"Failed to mark source as processed: {e}")
+        raise RuntimeError(f"Failed to mark sources as processed: {e}")
+
+def mark_source_processed(source_id: str, loader_used: str = None) -> bool:
+    """
+    Mark a source as processed in the database.
+    """
+    return mark_sources_processed([source_id], loader_used) > 0
 
-def get_sources_by_study_kit(studyKitId: str) -> List[Dict]:
+def count_sources(
+    studyKitId: Optional[str] = None,
+    processed: Optional[bool] = None,
+    leased: bool = False,
+    processed_since: Optional[datetime] = None
+) -> int:
     """
-    Get all sources for a specific study kit.
+    Count Source rows server-side (count="exact" head request: no rows are transferred).
+    leased=True counts only rows under an unexpired ingestion lease.
     """
     try:
-        response = (
-            supabase.table("Source")
-            .select("*")
-            .eq("studyKitId", studyKitId)
-            .execute()
-        )
-        return response.data
+        query = supabase.table("Source").select("id", count="exact", head=True)
+        if studyKitId:
+            query = query.eq("studyKitId", studyKitId)
+        if processed is not None:
+            query = query.eq("processed", processed)
+        if leased:
+            query = query.gt("leaseExpiresAt", utc_timestamp())
+        if processed_since:
+            query = query.gte("processedAt", utc_timestamp(processed_since))
+        response = query.execute()
+        return response.count or 0
+    except Exception as e:
+        raise RuntimeError(f"Failed to count sources: {e}")
+
+def latest_processed_at(studyKitId: Optional[str] = None) -> Optional[str]:
+    """
+    processedAt of the most recently processed source (one row, not the whole set).
+    """
+    try:
+        query = supabase.table("Source").select("processedAt").not_.is_("processedAt", "null")
+        if studyKitId:
+            query = query.eq("studyKitId", studyKitId)
+        response = query.order("processedAt", desc=True).limit(1).execute()
+        return response.data[0]["processedAt"] if response.data else None
+    except Exception as e:
+        raise RuntimeError(f"Failed to read latest processedAt: {e}")
+
+def fetch_source_counts_by_kit(studyKitId: Optional[str] = None) -> List[Dict]:
+    """
+    Per-study-kit totals (total, processed, in_progress), aggregated in Postgres.
+    """
+    try:
+        response = supabase.rpc("source_counts_by_kit", {"p_study_kit_id": studyKitId}).execute()
+        return response.data or []
+    except Exception as e:
+        raise RuntimeError(f"Failed to count sources by study kit: {e}")
+
+def get_sources_by_study_kit(studyKitId: str, columns: Sequence[str] = SOURCE_COLUMNS) -> List[Dict]:
+    """
+    Get all sources for a specific study kit (paged; see stream_source_pages for large kits).
+    """
+    try:
+        return [row for page in iter_source_pages(columns, studyKitId) for row in page]
     except Exception as e:
         raise RuntimeError(f"Failed to fetch sources for studyKitId {studyKitId}: {e}")
 
-def get_source_by_id(source_id: str) -> Optional[Dict]:
+def get_source_by_id(source_id: str, columns: Sequence[str] = SOURCE_COLUMNS) -> Optional[Dict]:
     """
     Get a single source by ID.
     """
     try:
         response = (
             supabase.table("Source")
-            .select("*")
+            .select(_select(columns))
             .eq("id", source_id)
             .single()
             .execute()
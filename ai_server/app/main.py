@@ -1,7 +1,19 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
-from app.api import rag, test_creation, flashcard, summarizer, mcq, ingestion
+from app.api import rag, test_creation, flashcard, summarizer, mcq, ingestion, metrics
+from app.services.extraction import extraction_engine
+from app.services.http_client import http_client
+from app.services.llm import llm_registry
+from app.services.vectorstore import vectorstore_manager
+from app.services.lexical_index import lexical_index
+from app.services.embedding_writer import embedding_writer
+from app.services.status_writer import status_writer
+from app.services.reranker import reranker
+from app.services.job_queue import job_queue
+from app.services.ingest_worker import WorkerPool, INGEST_START_WORKERS
 
  
 # Configure logging
@@ -9,9 +21,44 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_client.start()
+    # Background ingestion endpoints only enqueue jobs; these processes run them
+    ingest_pool = WorkerPool() if INGEST_START_WORKERS else None
+    if ingest_pool is not None:
+        ingest_pool.start()
+    warmed = llm_registry.warm()
+    logger.info("Warmed LLM clients: %s", warmed)
+    try:
+        # Open the default collection now rather than on the first query
+        vectorstore_manager.get()
+    except Exception as e:
+        logger.warning("Could not open vector store at startup: %s", e)
+    try:
+        await asyncio.to_thread(reranker.warm)
+    except Exception as e:
+        logger.warning("Could not load re-ranker, keeping retriever order: %s", e)
+        reranker.enabled = False
+    yield
+    if ingest_pool is not None:
+        await asyncio.to_thread(ingest_pool.stop)
+    # Flush queued chunks before the vector store handles are released
+    await embedding_writer.close()
+    # Then mark the sources whose chunks are stored
+    await status_writer.close()
+    vectorstore_manager.close()
+    lexical_index.close()
+    job_queue.close()
+    await llm_registry.aclose()
+    await http_client.close()
+    extraction_engine.shutdown()
+
+
 app = FastAPI(
     title="AI Backend Server",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,6 +78,7 @@ app.include_router(test_creation.router, prefix="/api/tests", tags=["Tests"])
 app.include_router(rag.router, prefix="/api/rag", tags=["RAG Chat"])
 app.include_router(summarizer.router, prefix="/api/summarize", tags=["Summarization"])
 app.include_router(ingestion.router, prefix="/api", tags=["Ingestion"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
 
 
 @app.get("/")
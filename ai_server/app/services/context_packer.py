@@ -0,0 +1,138 @@
+# app/services/context_packer.py
+import os
+import re
+import logging
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Context tokens per prompt (passages only, not the instructions around them)
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+GENERATOR_CONTEXT_TOKENS = int(os.getenv("GENERATOR_CONTEXT_TOKENS", "2000"))
+# Passages whose word shingles overlap at least this much with a better-ranked one are dropped
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# A passage that no longer fits is truncated only if at least this many tokens are left
+CONTEXT_MIN_TAIL_TOKENS = int(os.getenv("CONTEXT_MIN_TAIL_TOKENS", "64"))
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+_LABEL_RE = re.compile(r"^\s*\[(?P<label>[^\]]+)\]\s*(?P<body>.*)$", flags=re.DOTALL)
+# Shortest shared prefix/suffix treated as chunk overlap (the splitter overlaps by 200 chars)
+_MIN_OVERLAP_CHARS = 40
+
+
+class _Tokenizer:
+    def __init__(self, count: Callable[[str], int], truncate: Callable[[str, int], str]):
+        self.count = count
+        self.truncate = truncate
+
+
+@lru_cache(maxsize=16)
+def get_tokenizer(model: Optional[str] = None) -> _Tokenizer:
+    """The model's tiktoken encoding when available, else a ~4 chars/token estimate"""
+    try:
+        import tiktoken
+
+        try:
+            enc = tiktoken.encoding_for_model(model or "gpt-4o")
+        except KeyError:
+            # Non-OpenAI models (groq, ollama): a close enough BPE for budgeting
+            enc = tiktoken.get_encoding("cl100k_base")
+        return _Tokenizer(
+            lambda text: len(enc.encode(text, disallowed_special=())),
+            lambda text, n: enc.decode(enc.encode(text, disallowed_special=())[:n]),
+        )
+    except ImportError:
+        logger.info("tiktoken not installed; estimating context tokens from length")
+        return _Tokenizer(lambda text: max(1, len(text) // 4), lambda text, n: text[:n * 4])
+
+
+def split_label(context: str) -> Tuple[Optional[str], str]:
+    """'[file.pdf] text' -> ('file.pdf', 'text'); unlabeled contexts give (None, text)"""
+    m = _LABEL_RE.match(context)
+    if m:
+        return m.group("label").strip(), m.group("body").strip()
+    return None, context.strip()
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _trim_overlap(kept: str, body: str) -> str:
+    """Remove the part of body that repeats the start or end of an already kept passage"""
+    # body starts with kept's tail (next chunk of the same source)
+    head = body[:_MIN_OVERLAP_CHARS]
+    pos = kept.find(head)
+    if pos >= 0 and body.startswith(kept[pos:]):
+        return body[len(kept) - pos:].lstrip()
+    # body ends with kept's head (previous chunk)
+    pos = body.find(kept[:_MIN_OVERLAP_CHARS])
+    if pos >= 0 and kept.startswith(body[pos:]):
+        return body[:pos].rstrip()
+    return body
+
+
+def _cut_at_boundary(text: str) -> str:
+    # End on a sentence (or at least a word) so the model doesn't see half a token run
+    for marker in (". ", ".\n", "\n"):
+        pos = text.rfind(marker)
+        if pos > len(text) // 2:
+            return text[:pos + 1].rstrip()
+    pos = text.rfind(" ")
+    return text[:pos].rstrip() if pos > 0 else text
+
+
+def pack_contexts(
+    contexts: List[str],
+    budget_tokens: int = GENERATOR_CONTEXT_TOKENS,
+    model: Optional[str] = None,
+    max_chars_per_doc: Optional[int] = None,
+    separator: str = CONTEXT_SEPARATOR
+) -> List[str]:
+    """
+    Choose passages for a prompt, best first (contexts are expected in relevance order):
+    drops near-duplicates, trims text that repeats a neighbouring chunk's overlap,
+    and stops at budget_tokens counted with the target model's tokenizer.
+    The last passage is cut at a sentence boundary if part of it still fits.
+    """
+    if not contexts or budget_tokens <= 0:
+        return []
+    tokenizer = get_tokenizer(model)
+    sep_tokens = tokenizer.count(separator)
+
+    packed: List[str] = []
+    kept_bodies: List[str] = []
+    kept_shingles: List[set] = []
+    used = 0
+    for context in contexts:
+        label, body = split_label(context)
+        if max_chars_per_doc:
+            body = body[:max_chars_per_doc].strip()
+        for kept in kept_bodies:
+            if len(body) < _MIN_OVERLAP_CHARS:
+                break
+            body = _trim_overlap(kept, body)
+        if not body:
+            continue
+        shingles = _shingles(body)
+        if any(len(shingles & s) / max(1, min(len(shingles), len(s))) >= CONTEXT_DEDUP_THRESHOLD for s in kept_shingles):
+            continue
+
+        text = f"[{label}] {body}" if label else body
+        cost = tokenizer.count(text) + (sep_tokens if packed else 0)
+        if used + cost > budget_tokens:
+            remaining = budget_tokens - used - (sep_tokens if packed else 0)
+            if remaining >= CONTEXT_MIN_TAIL_TOKENS:
+                cut = _cut_at_boundary(tokenizer.truncate(text, remaining))
+                if cut:
+                    packed.append(cut)
+            break
+        packed.append(text)
+        kept_bodies.append(body)
+        kept_shingles.append(shingles)
+        used += cost
+    return packed
@@ -0,0 +1,201 @@
+# app/services/embedding_cache.py
+import os
+import re
+import json
+import hashlib
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.services.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "./.embedding_cache")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _ModelStore:
+    """
+    Append-only store for one embedding model, shared by every process on the host:
+      vectors.f32 - row-major float32 matrix, read through a memory map
+      keys.txt    - one SHA-256 per line; line number == row number
+      meta.json   - {"dim": <embedding dimension>}
+      LOCK        - flock held while appending
+    Vectors are appended before their keys, so a key on disk always has its row.
+    Rows appended by other processes are picked up by reading keys.txt past
+    the last offset seen.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._keys_path = os.path.join(directory, "keys.txt")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock_path = os.path.join(directory, "LOCK")
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._count = 0
+        # Bytes of keys.txt already read into rows
+        self._keys_offset = 0
+        self._mm: Optional[np.memmap] = None
+        self._refresh()
+
+    def _read_dim(self) -> Optional[int]:
+        if self.dim is None:
+            try:
+                with open(self._meta_path, "r", encoding="utf-8") as fh:
+                    self.dim = json.load(fh)["dim"]
+            except (OSError, ValueError, KeyError):
+                pass
+        return self.dim
+
+    def _refresh(self, repair: bool = False):
+        """
+        Read keys appended since the last call, up to the rows whose vectors are
+        fully written. With repair (LOCK held) also cut off a torn tail left by a
+        writer that died between the two appends, so new rows stay aligned.
+        """
+        if self._read_dim() is None:
+            return
+        try:
+            stored_rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        except OSError:
+            stored_rows = 0
+        try:
+            with open(self._keys_path, "rb") as fh:
+                fh.seek(self._keys_offset)
+                tail = fh.read()
+        except OSError:
+            tail = b""
+        # The last piece is empty or a line still being written
+        for line in tail.split(b"\n")[:-1]:
+            if self._count >= stored_rows:
+                break
+            self.rows.setdefault(line.decode("ascii").strip(), self._count)
+            self._count += 1
+            self._keys_offset += len(line) + 1
+        if repair:
+            if os.path.exists(self._keys_path) and os.path.getsize(self._keys_path) != self._keys_offset:
+                with open(self._keys_path, "r+b") as fh:
+                    fh.truncate(self._keys_offset)
+            expected = self._count * self.dim * 4
+            if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != expected:
+                with open(self._vectors_path, "r+b") as fh:
+                    fh.truncate(expected)
+
+    def _matrix(self) -> Optional[np.memmap]:
+        n = self._count
+        if n == 0:
+            return None
+        if self._mm is None or self._mm.shape[0] < n:
+            self._mm = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._mm
+
+    def get(self, keys: List[str]) -> List[Optional[List[float]]]:
+        self._refresh()
+        matrix = self._matrix()
+        out = []
+        for k in keys:
+            row = self.rows.get(k)
+            out.append(matrix[row].tolist() if row is not None and matrix is not None else None)
+        return out
+
+    def put(self, keys: List[str], vectors: List[List[float]]):
+        with file_lock(self._lock_path):
+            # Another process may have stored some of these since get()
+            self._refresh(repair=True)
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self.rows]
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = len(new[0][1])
+                with open(self._meta_path, "w", encoding="utf-8") as fh:
+                    json.dump({"dim": self.dim}, fh)
+
+            matrix = np.asarray([v for _, v in new], dtype=np.float32)
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match cache dimension {self.dim}")
+
+            with open(self._vectors_path, "ab") as fh:
+                fh.write(matrix.tobytes())
+            lines = "".join(k + "\n" for k, _ in new).encode("ascii")
+            with open(self._keys_path, "ab") as fh:
+                fh.write(lines)
+
+            for k, _ in new:
+                self.rows[k] = self._count
+                self._count += 1
+            self._keys_offset += len(lines)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (embedding model, SHA-256 of chunk text).
+    """
+
+    def __init__(self, cache_dir: str = EMBED_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._stores: Dict[str, _ModelStore] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def _store(self, model: str) -> _ModelStore:
+        store = self._stores.get(model)
+        if store is None:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+            store = _ModelStore(os.path.join(self.cache_dir, slug))
+            self._stores[model] = store
+        return store
+
+    def embed(self, model: str, texts: List[str], embed_fn) -> Tuple[List[List[float]], List[bool]]:
+        """
+        Return embeddings for texts, calling embed_fn(list_of_texts) only for
+        cache misses (each distinct text at most once).
+        Returns (vectors, hit_flags) where hit_flags[i] is True if texts[i] came from the cache.
+        """
+        if not texts:
+            return [], []
+
+        keys = [text_hash(t) for t in texts]
+        with self._lock:
+            cached = self._store(model).get(keys)
+
+        missing: Dict[str, str] = {}
+        for k, t, v in zip(keys, texts, cached):
+            if v is None and k not in missing:
+                missing[k] = t
+
+        fresh: Dict[str, List[float]] = {}
+        if missing:
+            miss_keys = list(missing.keys())
+            vectors = embed_fn([missing[k] for k in miss_keys])
+            fresh = dict(zip(miss_keys, vectors))
+            with self._lock:
+                try:
+                    self._store(model).put(miss_keys, vectors)
+                except Exception as e:
+                    logger.warning(f"Failed to write embedding cache for {model}: {e}")
+
+        hit_flags = [v is not None for v in cached]
+        hits = sum(hit_flags)
+        with self._lock:
+            self.metrics["hits"] += hits
+            self.metrics["misses"] += len(texts) - hits
+        return [v if v is not None else fresh[k] for k, v in zip(keys, cached)], hit_flags
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else 0.0,
+                "models": {m: s._count for m, s in self._stores.items()},
+            }
+
+# Global instance
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,189 @@
+# app/services/embedding_writer.py
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from app.services.vectorstore import embed_texts, store_embedded_documents, DEFAULT_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# A flush happens once either size limit is reached or the oldest request has waited max_wait
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "512"))
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "200000"))
+EMBED_BATCH_MAX_WAIT = float(os.getenv("EMBED_BATCH_MAX_WAIT", "0.5"))
+# Backpressure: submitters wait while this many chunks are queued
+EMBED_WRITER_MAX_PENDING = int(os.getenv("EMBED_WRITER_MAX_PENDING", "4096"))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for batch sizing
+    return max(1, len(text) // 4)
+
+
+class _WriteRequest:
+    def __init__(self, documents: List[Document], collection_name: str):
+        self.documents = documents
+        self.collection_name = collection_name
+        self.tokens = sum(estimate_tokens(d.page_content) for d in documents)
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class EmbeddingWriter:
+    """
+    Coalesces chunks from concurrently ingested sources into large embedding
+    requests, then writes each flush to the collection in one bulk call.
+    submit() resolves once that source's chunks are stored.
+    """
+
+    def __init__(
+        self,
+        max_items: int = EMBED_BATCH_MAX_ITEMS,
+        max_tokens: int = EMBED_BATCH_MAX_TOKENS,
+        max_wait: float = EMBED_BATCH_MAX_WAIT,
+        max_pending: int = EMBED_WRITER_MAX_PENDING
+    ):
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self._pending: List[_WriteRequest] = []
+        self._pending_items = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.metrics = {"flushes": 0, "embedding_calls": 0, "chunks_written": 0}
+
+    def _ensure_started(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, documents: List[Document], collection_name: Optional[str] = None) -> Dict:
+        """Queue documents for embedding + storage and wait until they are written"""
+        if not documents:
+            return {"inserted": 0, "embedding_cache_hits": 0, "embedding_cache_misses": 0}
+        if self._closing:
+            raise RuntimeError("Embedding writer is shutting down")
+        self._ensure_started()
+
+        request = _WriteRequest(documents, collection_name or DEFAULT_COLLECTION)
+        async with self._cond:
+            # A single oversized request is still admitted when the queue is empty
+            await self._cond.wait_for(
+                lambda: self._closing or self._pending_items == 0 or self._pending_items + len(documents) <= self.max_pending
+            )
+            # close() may have drained the queue while this was held back; nothing would flush it now
+            if self._closing:
+                raise RuntimeError("Embedding writer is shutting down")
+            self._pending.append(request)
+            self._pending_items += len(documents)
+            self._cond.notify_all()
+        return await request.future
+
+    def _batch_ready(self) -> bool:
+        items = sum(len(r.documents) for r in self._pending)
+        tokens = sum(r.tokens for r in self._pending)
+        return items >= self.max_items or tokens >= self.max_tokens
+
+    def _take_batch(self) -> List[_WriteRequest]:
+        batch, items, tokens = [], 0, 0
+        while self._pending:
+            r = self._pending[0]
+            if batch and (items + len(r.documents) > self.max_items or tokens + r.tokens > self.max_tokens):
+                break
+            batch.append(self._pending.pop(0))
+            items += len(r.documents)
+            tokens += r.tokens
+        self._pending_items -= items
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._pending or self._closing)
+                if not self._pending and self._closing:
+                    return
+                # Linger briefly so concurrent sources can join this batch
+                deadline = loop.time() + self.max_wait
+                while not self._closing and not self._batch_ready():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch = self._take_batch()
+                self._cond.notify_all()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[_WriteRequest]):
+        # One embedding request and one bulk write per collection in this flush;
+        # collections may use different embedding backends
+        by_collection: Dict[str, List[_WriteRequest]] = {}
+        for r in batch:
+            by_collection.setdefault(r.collection_name, []).append(r)
+
+        for collection_name, requests in by_collection.items():
+            try:
+                docs = [d for r in requests for d in r.documents]
+                calls = 0
+
+                def count_call(n_texts: int):
+                    nonlocal calls
+                    calls += 1
+
+                try:
+                    vectors, hit_flags = await asyncio.to_thread(
+                        embed_texts, [d.page_content for d in docs], collection_name, count_call
+                    )
+                finally:
+                    self.metrics["embedding_calls"] += calls
+                await asyncio.to_thread(store_embedded_documents, docs, vectors, collection_name=collection_name)
+
+                self.metrics["chunks_written"] += len(docs)
+                start = 0
+                for r in requests:
+                    hits = sum(hit_flags[start:start + len(r.documents)])
+                    start += len(r.documents)
+                    if not r.future.done():
+                        r.future.set_result({
+                            "inserted": len(r.documents),
+                            "embedding_cache_hits": hits,
+                            "embedding_cache_misses": len(r.documents) - hits,
+                        })
+            except Exception as e:
+                logger.error(f"Embedding writer flush of {len(requests)} sources to {collection_name} failed: {e}")
+                for r in requests:
+                    if not r.future.done():
+                        r.future.set_exception(e)
+        self.metrics["flushes"] += 1
+
+    async def close(self):
+        """Flush everything still queued, then stop the background task"""
+        if self._cond is None:
+            return
+        self._closing = True
+        async with self._cond:
+            self._cond.notify_all()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        # Anything still queued (the background task died) would otherwise never resolve
+        for r in self._pending:
+            if not r.future.done():
+                r.future.set_exception(RuntimeError("Embedding writer is shutting down"))
+        self._pending.clear()
+        self._pending_items = 0
+        # Allow reuse if the app is started again in the same process
+        self._cond = None
+        self._closing = False
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "pending_chunks": self._pending_items}
+
+# Global instance
+embedding_writer = EmbeddingWriter()
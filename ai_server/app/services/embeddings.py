@@ -0,0 +1,148 @@
+# app/services/embeddings.py
+import os
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Per-collection overrides: "collection=backend:model,other=backend:model"
+COLLECTION_EMBEDDINGS = os.getenv("COLLECTION_EMBEDDINGS", "")
+
+# Local engine tuning
+EMBED_LOCAL_THREADS = int(os.getenv("EMBED_LOCAL_THREADS", str(os.cpu_count() or 4)))
+EMBED_LOCAL_BATCH_SIZE = int(os.getenv("EMBED_LOCAL_BATCH_SIZE", "64"))
+EMBED_LOCAL_QUERY_BATCH = int(os.getenv("EMBED_LOCAL_QUERY_BATCH", "32"))
+EMBED_LOCAL_QUERY_WAIT_MS = float(os.getenv("EMBED_LOCAL_QUERY_WAIT_MS", "2"))
+# "int8" applies dynamic int8 quantization to the torch model; "onnx" / "onnx-int8" use the ONNX backend
+EMBED_LOCAL_OPTIMIZE = os.getenv("EMBED_LOCAL_OPTIMIZE", "")
+EMBED_LOCAL_ONNX_INT8_FILE = os.getenv("EMBED_LOCAL_ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+# Never reach the network for model files (they must already be in the HF cache)
+EMBED_LOCAL_FILES_ONLY = os.getenv("EMBED_LOCAL_FILES_ONLY", "0") == "1"
+
+
+class EmbeddingSpec(NamedTuple):
+    backend: str
+    model: str
+
+    @property
+    def cache_key(self) -> str:
+        # OpenAI keys stay bare model names so existing embedding cache entries remain valid
+        return self.model if self.backend == "openai" else f"{self.backend}:{self.model}"
+
+
+def _parse_spec(value: str) -> EmbeddingSpec:
+    backend, _, model = value.partition(":")
+    backend = backend.strip() or EMBED_BACKEND
+    model = model.strip() or (EMBED_MODEL if backend == "openai" else LOCAL_EMBED_MODEL)
+    return EmbeddingSpec(backend, model)
+
+DEFAULT_SPEC = _parse_spec(EMBED_BACKEND)
+_COLLECTION_SPECS: Dict[str, EmbeddingSpec] = {
+    name.strip(): _parse_spec(spec)
+    for name, _, spec in (item.partition("=") for item in COLLECTION_EMBEDDINGS.split(",") if "=" in item)
+}
+
+def spec_for_collection(collection_name: Optional[str]) -> EmbeddingSpec:
+    """Embedding backend/model used by a collection (vectors are only comparable within one)"""
+    return _COLLECTION_SPECS.get(collection_name or "", DEFAULT_SPEC)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformers engine on CPU, with the langchain Embeddings interface.
+    Documents are encoded in batches; concurrent embed_query calls from different
+    threads are coalesced into one encode call (dynamic batching).
+    """
+
+    def __init__(self, model_name: str = LOCAL_EMBED_MODEL):
+        self.model_name = model_name
+        self._model = self._load(model_name)
+        self._queries: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = threading.Thread(target=self._query_loop, name="local-embed-queries", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def _load(model_name: str):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(EMBED_LOCAL_THREADS)
+        kwargs = {"device": "cpu", "local_files_only": EMBED_LOCAL_FILES_ONLY}
+        if EMBED_LOCAL_OPTIMIZE.startswith("onnx"):
+            kwargs["backend"] = "onnx"
+            if EMBED_LOCAL_OPTIMIZE == "onnx-int8":
+                kwargs["model_kwargs"] = {"file_name": EMBED_LOCAL_ONNX_INT8_FILE}
+        model = SentenceTransformer(model_name, **kwargs)
+        if EMBED_LOCAL_OPTIMIZE == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info(f"Loaded local embedding model {model_name} (optimize={EMBED_LOCAL_OPTIMIZE or 'none'})")
+        return model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=EMBED_LOCAL_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def _query_loop(self):
+        wait = EMBED_LOCAL_QUERY_WAIT_MS / 1000.0
+        while True:
+            batch = [self._queries.get()]
+            try:
+                while len(batch) < EMBED_LOCAL_QUERY_BATCH:
+                    batch.append(self._queries.get(timeout=wait))
+            except queue.Empty:
+                pass
+            try:
+                vectors = self._encode([text for text, _ in batch])
+                for (_, fut), vec in zip(batch, vectors):
+                    fut.set_result(vec)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        fut: Future = Future()
+        self._queries.put((text, fut))
+        return fut.result()
+
+
+_instances: Dict[EmbeddingSpec, object] = {}
+_lock = threading.Lock()
+
+def get_embeddings_for_spec(spec: EmbeddingSpec):
+    """Shared embedding function instance per (backend, model)"""
+    emb = _instances.get(spec)
+    if emb is not None:
+        return emb
+    with _lock:
+        emb = _instances.get(spec)
+        if emb is None:
+            if spec.backend == "openai":
+                emb = OpenAIEmbeddings(model=spec.model)
+            elif spec.backend == "local":
+                emb = LocalEmbeddings(spec.model)
+            else:
+                raise ValueError(f"Unsupported embedding backend: {spec.backend}")
+            _instances[spec] = emb
+        return emb
@@ -0,0 +1,144 @@
+# app/services/extraction.py
+import os
+import logging
+import time
+import multiprocessing
+from contextlib import contextmanager
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple, Union
+from pypdf import PdfReader
+import docx2txt
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT_SECONDS", "180"))
+# PDFs with at most this many pages are extracted in one task
+EXTRACT_PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "40"))
+
+# A source is either the raw bytes or a path to a spooled file on disk.
+# Paths are preferred: workers open the file themselves instead of receiving a pickled copy.
+Source = Union[bytes, str]
+
+@contextmanager
+def _pdf_reader(src: Source):
+    if isinstance(src, (bytes, bytearray)):
+        yield PdfReader(BytesIO(src))
+        return
+    # Pass an open handle rather than the path: pypdf reads a path fully into memory
+    with open(src, "rb") as fh:
+        yield PdfReader(fh)
+
+# --- worker functions (top-level so they can be pickled into the pool) ---
+def _extract_pdf_pages(src: Source, start: int, end: int) -> List[str]:
+    with _pdf_reader(src) as reader:
+        return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def _extract_pdf_head(src: Source, end: int) -> Tuple[int, List[str]]:
+    """Page count and the text of the first `end` pages (all of a small PDF)"""
+    with _pdf_reader(src) as reader:
+        num_pages = len(reader.pages)
+        return num_pages, [(reader.pages[i].extract_text() or "") for i in range(min(end, num_pages))]
+
+def _extract_docx(src: Source) -> str:
+    if isinstance(src, (bytes, bytearray)):
+        src = BytesIO(src)
+    return docx2txt.process(src) or ""
+
+
+class ExtractionEngine:
+    """
+    Text extraction backed by a worker process pool.
+    Every parse runs in the pool; large PDFs are split into page ranges that
+    are extracted in parallel and reassembled in page order.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = EXTRACT_WORKERS,
+        timeout: float = EXTRACT_TIMEOUT,
+        pages_per_task: int = EXTRACT_PAGES_PER_TASK
+    ):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.pages_per_task = max(1, pages_per_task)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a threaded server process is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _recycle_pool(self, pool: ProcessPoolExecutor):
+        """
+        Kill the pool's workers and drop it; the next call starts a fresh pool.
+        A timed-out parse keeps running in its worker otherwise, and enough of
+        them would pin every worker. Other tasks still on that pool fail with it.
+        """
+        if self._pool is pool:
+            self._pool = None
+        # kill_workers() only exists from Python 3.14
+        kill = getattr(pool, "kill_workers", None)
+        if kill is not None:
+            kill()
+        else:
+            for proc in list((getattr(pool, "_processes", None) or {}).values()):
+                proc.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, args_list: List[tuple], timeout: Optional[float]) -> list:
+        """Submit one task per args tuple and return results in submission order"""
+        timeout = self.timeout if timeout is None else timeout
+        pool = self._get_pool()
+        try:
+            futures = [pool.submit(fn, *args) for args in args_list]
+        except BrokenProcessPool:
+            self._recycle_pool(pool)
+            raise RuntimeError("Extraction worker pool is broken; it will be recreated on next use")
+
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+        for f in pending:
+            f.cancel()
+        for f in done:
+            exc = f.exception()
+            if isinstance(exc, BrokenProcessPool):
+                self._recycle_pool(pool)
+                raise RuntimeError("Extraction worker crashed; the pool will be recreated on next use")
+            if exc is not None:
+                raise exc
+        if pending:
+            self._recycle_pool(pool)
+            raise RuntimeError(f"Text extraction timed out after {timeout}s")
+        return [f.result() for f in futures]
+
+    def pdf_to_text(self, src: Source, timeout: Optional[float] = None) -> str:
+        # Opening the PDF parses its page tree, so even that happens in a worker
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        num_pages, pages = self._run(_extract_pdf_head, [(src, self.pages_per_task)], timeout)[0]
+
+        ranges = [
+            (src, start, min(start + self.pages_per_task, num_pages))
+            for start in range(self.pages_per_task, num_pages, self.pages_per_task)
+        ]
+        if ranges:
+            for chunk in self._run(_extract_pdf_pages, ranges, max(0.0, deadline - time.monotonic())):
+                pages.extend(chunk)
+        return "\n".join(pages).strip()
+
+    def docx_to_text(self, src: Source, timeout: Optional[float] = None) -> str:
+        return self._run(_extract_docx, [(src,)], timeout)[0]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Global instance
+extraction_engine = ExtractionEngine()
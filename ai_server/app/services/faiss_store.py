@@ -0,0 +1,638 @@
+# app/services/faiss_store.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+import faiss
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+from app.services.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+FAISS_DIR = os.getenv("FAISS_PERSIST_DIR", "./.faiss_db")
+# "hnsw" (graph, exact vectors) or "ivfpq" (inverted lists + product quantization, much smaller)
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw")
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "256"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+# Sub-quantizers per vector (bytes per code); rounded down to a divisor of the dimension
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "32"))
+# IVF-PQ has to be trained; a collection stays on HNSW until it holds this many vectors
+FAISS_IVF_MIN_TRAIN = int(os.getenv("FAISS_IVF_MIN_TRAIN", str(FAISS_IVF_NLIST * 39)))
+# Serve snapshots through a memory map instead of reading them into RAM
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# Drop deleted/replaced vectors once they make up this fraction of the index
+FAISS_COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.25"))
+# How often searches look for a snapshot published by another process
+FAISS_RELOAD_INTERVAL = float(os.getenv("FAISS_RELOAD_INTERVAL", "2"))
+# Filtered searches matching at most this many chunks are scored exactly instead of through the ANN index
+FAISS_FILTER_EXACT_MAX = int(os.getenv("FAISS_FILTER_EXACT_MAX", "20000"))
+# Upserts go into a private draft of the index and are published as one new snapshot once this
+# many vectors are waiting or the oldest has waited this long; the side table keeps them durable meanwhile
+FAISS_PUBLISH_MAX_ITEMS = int(os.getenv("FAISS_PUBLISH_MAX_ITEMS", "5000"))
+FAISS_PUBLISH_MAX_WAIT = float(os.getenv("FAISS_PUBLISH_MAX_WAIT", "5"))
+FAISS_KEEP_SNAPSHOTS = 2
+
+_SQL_BATCH = 500
+# Metadata fields searches can filter on -> indexed side table columns
+FILTER_COLUMNS = {"studyKitId": "study_kit_id", "source_id": "source_id", "file_type": "file_type"}
+
+
+def _normalized(vectors) -> np.ndarray:
+    # Inner product on unit vectors == cosine similarity
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+def _pq_subquantizers(dim: int, wanted: int) -> int:
+    m = max(1, min(wanted, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+class _Snapshot(NamedTuple):
+    index: Any
+    kind: str
+    version: int
+    next_id: int
+    path: str
+
+
+class _Draft(NamedTuple):
+    index: Any
+    kind: str
+    next_id: int
+    # Snapshot version the draft was built on; a newer snapshot from another process invalidates it
+    base_version: int
+
+
+class _MetadataTable:
+    """
+    Side table mapping FAISS int64 ids to chunk ids, text and metadata.
+    A vector whose id has no row here is dead (replaced or deleted) and is
+    skipped by searches until the next compaction drops it from the index.
+    Vectors not yet in any snapshot are logged in the pending table, so a
+    crash before the next publish loses nothing.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL UNIQUE, source_id TEXT,"
+            " document TEXT NOT NULL, metadata TEXT NOT NULL, study_kit_id TEXT, file_type TEXT)"
+        )
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(chunks)")}
+        for field, column in FILTER_COLUMNS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} TEXT")
+                self._conn.execute(f"UPDATE chunks SET {column} = json_extract(metadata, '$.{field}')")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS chunks_{column} ON chunks ({column})")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _select_in(self, sql: str, values: List[Any]) -> List[tuple]:
+        rows = []
+        for i in range(0, len(values), _SQL_BATCH):
+            batch = values[i:i + _SQL_BATCH]
+            rows.extend(self._conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+        return rows
+
+    def replace(self, chunk_ids: List[str], ids: List[int], documents: List[str], metadatas: List[dict], vectors: np.ndarray):
+        """Insert or replace chunk rows and log their vectors, in one transaction"""
+        rows = [
+            (int(i), c, d, json.dumps(m or {}), *[(m or {}).get(f) for f in FILTER_COLUMNS])
+            for i, c, d, m in zip(ids, chunk_ids, documents, metadatas)
+        ]
+        columns = ", ".join(["id", "chunk_id", "document", "metadata", *FILTER_COLUMNS.values()])
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO chunks ({columns}) VALUES ({', '.join('?' * (4 + len(FILTER_COLUMNS)))})", rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pending (id, vector) VALUES (?, ?)",
+                [(int(i), v.tobytes()) for i, v in zip(ids, vectors)]
+            )
+            self._conn.commit()
+
+    def pending(self, from_id: int) -> Tuple[np.ndarray, Optional[np.ndarray], int]:
+        """
+        Logged vectors with id >= from_id whose chunk is still live, plus the
+        next free id (ids of replaced chunks are never reused).
+        """
+        next_id = self.next_pending_id()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.id, p.vector FROM pending p JOIN chunks c ON c.id = p.id WHERE p.id >= ? ORDER BY p.id",
+                (from_id,)
+            ).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), None, next_id
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        return ids, np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows]), next_id
+
+    def next_pending_id(self) -> int:
+        with self._lock:
+            last = self._conn.execute("SELECT MAX(id) FROM pending").fetchone()[0]
+        return last + 1 if last is not None else 0
+
+    def has_pending(self, from_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM pending WHERE id >= ? LIMIT 1", (from_id,)).fetchone() is not None
+
+    def clear_pending(self, below_id: int):
+        """Drop logged vectors that a published snapshot now holds"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pending WHERE id < ?", (below_id,))
+            self._conn.commit()
+
+    def delete(self, chunk_ids: List[str]) -> int:
+        removed = 0
+        with self._lock:
+            for i in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = chunk_ids[i:i + _SQL_BATCH]
+                cur = self._conn.execute(
+                    f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                )
+                removed += cur.rowcount
+            self._conn.commit()
+        return removed
+
+    def rows(self, ids: List[int]) -> Dict[int, Tuple[str, str, dict]]:
+        with self._lock:
+            found = self._select_in("SELECT id, chunk_id, document, metadata FROM chunks WHERE id IN ({})", ids)
+        return {i: (c, d, json.loads(m)) for i, c, d, m in found}
+
+    def ids_for(self, chunk_ids: List[str]) -> List[int]:
+        with self._lock:
+            return [r[0] for r in self._select_in("SELECT id FROM chunks WHERE chunk_id IN ({})", chunk_ids)]
+
+    def by_chunk_ids(self, chunk_ids: List[str]) -> List[tuple]:
+        with self._lock:
+            return self._select_in("SELECT chunk_id, metadata, document FROM chunks WHERE chunk_id IN ({})", chunk_ids)
+
+    def page(self, limit: int, offset: int) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chunk_id, metadata, document FROM chunks ORDER BY id LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+
+    def by_source(self, source_id: str) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chunk_id, metadata, document FROM chunks WHERE source_id = ?", (source_id,)
+            ).fetchall()
+
+    def ids_matching(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Ids of chunks whose metadata matches every field; list values match any of them"""
+        clauses, params = [], []
+        for field, value in filter.items():
+            if field not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter on {field!r}; supported fields: {', '.join(FILTER_COLUMNS)}")
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{FILTER_COLUMNS[field]} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM chunks WHERE {' AND '.join(clauses)}", params).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def live_ids(self) -> np.ndarray:
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM chunks").fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FaissVectorStore(VectorStore):
+    """
+    In-process ANN collection on FAISS, laid out as:
+      CURRENT             - JSON pointer to the live snapshot (replaced atomically)
+      index-<version>.faiss - immutable index snapshots, served via memory map
+      meta.sqlite3        - id -> chunk_id / text / metadata side table
+      LOCK                - flock taken by writers in every process
+
+    Writers add to a private draft of the index and, once enough writes have
+    accumulated (FAISS_PUBLISH_MAX_ITEMS / FAISS_PUBLISH_MAX_WAIT), publish it
+    by swapping CURRENT, then swap the in-memory handle; searches read whichever
+    snapshot they started with and never wait on a write. Buffered writes are
+    visible to get() at once and to searches after the next publish. Writers
+    in different processes take turns on LOCK and catch up with each other's
+    snapshots and logged vectors before writing; readers pick new snapshots
+    up on their own.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedding_function=None,
+        persist_directory: str = FAISS_DIR,
+        index_type: str = FAISS_INDEX_TYPE,
+        mmap: bool = FAISS_MMAP
+    ):
+        if index_type not in ("hnsw", "ivfpq"):
+            raise ValueError(f"Unsupported FAISS index type: {index_type}")
+        self.collection_name = collection_name
+        self._embedding = embedding_function
+        self.index_type = index_type
+        self.mmap = mmap
+        self.directory = os.path.join(persist_directory, collection_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self._pointer_path = os.path.join(self.directory, "CURRENT")
+        self._lock_path = os.path.join(self.directory, "LOCK")
+        self._table = _MetadataTable(os.path.join(self.directory, "meta.sqlite3"))
+        self._write_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._draft: Optional[_Draft] = None
+        self._unpublished = 0
+        self._publish_timer: Optional[threading.Timer] = None
+        self._pointer_mtime = 0
+        self._checked_at = 0.0
+        self.reload()
+        snap = self._snapshot
+        if self._table.has_pending(snap.next_id if snap else 0):
+            # Writes logged before a crash (here or in another process) but never published
+            self.flush()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    # --- snapshots ---
+    def _read_pointer(self) -> Optional[dict]:
+        try:
+            with open(self._pointer_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, path: str, kind: str, writable: bool = False):
+        index = None
+        if self.mmap and not writable:
+            try:
+                index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                logger.debug(f"Memory-mapped load not supported for {path}; reading it into memory")
+        if index is None:
+            index = faiss.read_index(path)
+        params = faiss.ParameterSpace()
+        if kind == "ivfpq":
+            params.set_index_parameter(index, "nprobe", FAISS_IVF_NPROBE)
+        else:
+            params.set_index_parameter(index, "efSearch", FAISS_HNSW_EF_SEARCH)
+        return index
+
+    def reload(self) -> bool:
+        """Swap in the snapshot CURRENT points to, if it is newer than the one being served"""
+        with self._reload_lock:
+            try:
+                mtime = os.stat(self._pointer_path).st_mtime_ns
+            except OSError:
+                return False
+            self._checked_at = time.monotonic()
+            if mtime == self._pointer_mtime:
+                return False
+            pointer = self._read_pointer()
+            if pointer is None or (self._snapshot and pointer["version"] <= self._snapshot.version):
+                self._pointer_mtime = mtime
+                return False
+            path = os.path.join(self.directory, pointer["file"])
+            self._snapshot = _Snapshot(
+                self._open(path, pointer["kind"]), pointer["kind"], pointer["version"], pointer["next_id"], path
+            )
+            self._pointer_mtime = mtime
+            return True
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._checked_at >= FAISS_RELOAD_INTERVAL:
+            self.reload()
+
+    def _publish(self, index, kind: str, next_id: int):
+        current = self._snapshot
+        version = (current.version if current else 0) + 1
+        name = f"index-{version:08d}.faiss"
+        path = os.path.join(self.directory, name)
+        faiss.write_index(index, path)
+        with open(path, "rb") as fh:
+            os.fsync(fh.fileno())
+
+        tmp = self._pointer_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"file": name, "kind": kind, "version": version, "next_id": next_id}, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._pointer_path)
+
+        # The draft keeps changing after this, so searches get their own copy
+        served = self._open(path, kind) if self.mmap else faiss.clone_index(index)
+        with self._reload_lock:
+            self._snapshot = _Snapshot(served, kind, version, next_id, path)
+            self._pointer_mtime = os.stat(self._pointer_path).st_mtime_ns
+        self._prune(version)
+
+    def _prune(self, version: int):
+        # Readers that still map an older file keep it alive until they finish (POSIX unlink)
+        for name in os.listdir(self.directory):
+            if name.startswith("index-") and name.endswith(".faiss"):
+                try:
+                    if int(name[6:-6]) <= version - FAISS_KEEP_SNAPSHOTS:
+                        os.remove(os.path.join(self.directory, name))
+                except (ValueError, OSError):
+                    pass
+
+    # --- index construction ---
+    def _new_index(self, dim: int, kind: str, train: Optional[np.ndarray] = None):
+        if kind == "ivfpq":
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, FAISS_IVF_NLIST, _pq_subquantizers(dim, FAISS_PQ_M), 8, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(train)
+            return index
+        inner = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(inner)
+
+    def _writable_index(self, dim: int):
+        snap = self._snapshot
+        if snap is None:
+            return self._new_index(dim, "hnsw"), "hnsw", 0
+        if snap.index.d != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {snap.index.d}")
+        # A memory-mapped index is a read-only view: load a private copy to modify
+        index = self._open(snap.path, snap.kind, writable=True) if self.mmap else faiss.clone_index(snap.index)
+        return index, snap.kind, snap.next_id
+
+    def _draft_index(self, dim: Optional[int] = None) -> Optional[_Draft]:
+        """
+        The private index writes go to (write locks held). It is reused across
+        upserts and only rebuilt from the served snapshot when another process
+        has published or logged vectors since, replaying logged vectors that
+        snapshot lacks.
+        """
+        snap = self._snapshot
+        base_version = snap.version if snap else 0
+        draft = self._draft
+        if draft is not None and draft.base_version == base_version and self._table.next_pending_id() <= draft.next_id:
+            if dim is not None and draft.index.d != dim:
+                raise ValueError(f"Embedding dimension {dim} does not match index dimension {draft.index.d}")
+            return draft
+        ids, vectors, next_pending = self._table.pending(snap.next_id if snap else 0)
+        if dim is None:
+            dim = snap.index.d if snap else (vectors.shape[1] if vectors is not None else None)
+            if dim is None:
+                return None
+        index, kind, next_id = self._writable_index(dim)
+        if vectors is not None:
+            index.add_with_ids(vectors, ids)
+        self._draft = _Draft(index, kind, max(next_id, next_pending), base_version)
+        self._unpublished = len(ids)
+        return self._draft
+
+    def _publish_draft(self):
+        """Compact the draft if due and publish it as the next snapshot (write locks held)"""
+        draft = self._draft
+        index, kind = draft.index, draft.kind
+        if self._needs_maintenance(index, kind, self._table.count()):
+            index, kind = self._maintain(index, kind, self._table.live_ids())
+        self._publish(index, kind, draft.next_id)
+        self._table.clear_pending(draft.next_id)
+        self._draft = _Draft(index, kind, draft.next_id, self._snapshot.version)
+        self._unpublished = 0
+
+    @staticmethod
+    def _hnsw_vectors(index) -> Tuple[np.ndarray, np.ndarray]:
+        ids = faiss.vector_to_array(index.id_map)
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+
+    def _needs_maintenance(self, index, kind: str, live_count: int) -> bool:
+        dead = index.ntotal - live_count
+        migrate = self.index_type == "ivfpq" and kind == "hnsw" and live_count >= FAISS_IVF_MIN_TRAIN
+        return migrate or dead > FAISS_COMPACT_RATIO * index.ntotal
+
+    def _maintain(self, index, kind: str, live: np.ndarray):
+        """Drop dead vectors, and move to IVF-PQ once there is enough training data"""
+        if kind == "ivfpq":
+            keep = faiss.IDSelectorBatch(live)
+            index.remove_ids(faiss.IDSelectorNot(keep))
+            return index, kind
+
+        ids, vectors = self._hnsw_vectors(index)
+        mask = np.isin(ids, live)
+        ids, vectors = ids[mask], vectors[mask]
+        migrate = self.index_type == "ivfpq" and len(ids) >= FAISS_IVF_MIN_TRAIN
+        kind = "ivfpq" if migrate else "hnsw"
+        rebuilt = self._new_index(index.d, kind, train=vectors if migrate else None)
+        if len(ids):
+            rebuilt.add_with_ids(vectors, ids)
+        if migrate:
+            logger.info(f"FAISS collection {self.collection_name}: trained IVF-PQ on {len(ids)} vectors")
+        return rebuilt, kind
+
+    # --- writes (same shape as the chroma collection calls used by vectorstore.py) ---
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None, documents: Optional[List[str]] = None):
+        if not ids:
+            return
+        ids = list(ids)
+        vectors = _normalized(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        documents = documents or ["" for _ in ids]
+        with self._write_lock, file_lock(self._lock_path):
+            self.reload()
+            draft = self._draft_index(vectors.shape[1])
+            # Replaced chunks get fresh int ids; their old vectors die with the old rows
+            int_ids = np.arange(draft.next_id, draft.next_id + len(ids), dtype=np.int64)
+            # Rows and logged vectors commit together, so the draft can always be rebuilt
+            self._table.replace(ids, int_ids.tolist(), documents, metadatas, vectors)
+            draft.index.add_with_ids(vectors, int_ids)
+            self._draft = draft._replace(next_id=draft.next_id + len(ids))
+            self._unpublished += len(ids)
+            if self._unpublished >= FAISS_PUBLISH_MAX_ITEMS:
+                self._publish_draft()
+            elif self._publish_timer is None:
+                self._publish_timer = threading.Timer(FAISS_PUBLISH_MAX_WAIT, self._publish_due)
+                self._publish_timer.daemon = True
+                self._publish_timer.start()
+
+    def _publish_due(self):
+        try:
+            self.flush()
+        except Exception as e:
+            # Still logged in the side table; the next write or flush publishes it
+            logger.error(f"FAISS collection {self.collection_name}: failed to publish buffered writes: {e}")
+
+    def flush(self):
+        """Publish buffered writes now instead of waiting for FAISS_PUBLISH_MAX_WAIT"""
+        with self._write_lock, file_lock(self._lock_path):
+            if self._publish_timer is not None:
+                self._publish_timer.cancel()
+                self._publish_timer = None
+            self.reload()
+            if self._draft_index() is not None and self._unpublished:
+                self._publish_draft()
+
+    def add_embeddings(self, texts: Iterable[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self.upsert(ids, embeddings, metadatas, texts)
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._write_lock, file_lock(self._lock_path):
+            # Compaction below builds on the newest snapshot, not a stale one another process replaced
+            self.reload()
+            self._table.delete(list(ids))
+            snap = self._snapshot
+            if snap is not None and self._needs_maintenance(snap.index, snap.kind, self._table.count()):
+                self._draft_index(snap.index.d)
+                self._publish_draft()
+        return True
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict[str, List]:
+        """Chunks by id, all chunks of one source (where={"source_id": ...}), or a page of everything"""
+        if ids is not None:
+            rows = self._table.by_chunk_ids(list(ids))
+        elif where:
+            if set(where) != {"source_id"}:
+                raise ValueError("FaissVectorStore.get only supports where={'source_id': ...}")
+            rows = self._table.by_source(where["source_id"])
+        else:
+            rows = self._table.page(limit or -1, offset)
+        return {
+            "ids": [c for c, _, _ in rows],
+            "metadatas": [json.loads(m) for _, m, _ in rows],
+            "documents": [d for _, _, d in rows],
+        }
+
+    # --- search ---
+    def _to_results(self, ids, scores) -> List[Tuple[Document, float]]:
+        hits = [(int(i), float(s)) for i, s in zip(ids, scores) if i >= 0]
+        rows = self._table.rows([i for i, _ in hits])
+        results = []
+        for i, score in hits:
+            row = rows.get(i)
+            if row is not None:
+                _, text, metadata = row
+                # cosine distance, lower is closer (same convention as Chroma)
+                results.append((Document(page_content=text, metadata=metadata), 1.0 - score))
+        return results
+
+    def _filtered_search(self, snap: _Snapshot, query: np.ndarray, k: int, filter: Dict[str, Any]):
+        candidates = self._table.ids_matching(filter)
+        if len(candidates) == 0:
+            return [], []
+        if len(candidates) <= FAISS_FILTER_EXACT_MAX and snap.kind == "hnsw":
+            # Small partitions (one study kit) are cheaper and exact to score directly;
+            # HNSW graph walks also miss results when only a few nodes pass the filter
+            try:
+                scores = snap.index.reconstruct_batch(candidates) @ query[0]
+                top = np.argsort(-scores)[:k]
+                return candidates[top], scores[top]
+            except RuntimeError:
+                pass  # a row committed after this snapshot was taken; use the selector path
+        sel = faiss.IDSelectorBatch(candidates)
+        fetch = min(k, len(candidates))
+        if snap.kind == "ivfpq":
+            # Selective filters scan every list; only matching codes are scored
+            selective = len(candidates) * FAISS_IVF_NLIST < snap.index.ntotal * FAISS_IVF_NPROBE
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=FAISS_IVF_NLIST if selective else FAISS_IVF_NPROBE)
+        else:
+            params = faiss.SearchParametersHNSW(sel=sel, efSearch=max(FAISS_HNSW_EF_SEARCH, fetch * 4))
+        scores, ids = snap.index.search(query, fetch, params=params)
+        return ids[0], scores[0]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> List[Tuple[Document, float]]:
+        """
+        filter restricts the search to chunks with matching metadata, e.g.
+        {"studyKitId": kit} or {"source_id": [a, b]}; see FILTER_COLUMNS.
+        """
+        self._maybe_reload()
+        snap = self._snapshot
+        if snap is None or snap.index.ntotal == 0 or k <= 0:
+            return []
+        query = _normalized(embedding)
+        if filter:
+            return self._to_results(*self._filtered_search(snap, query, k, filter))[:k]
+
+        total = snap.index.ntotal
+        # Over-fetch to make up for dead vectors; widen until k live hits or the index is exhausted
+        fetch = min(total, k * 2)
+        while True:
+            scores, ids = snap.index.search(query, fetch)
+            results = self._to_results(ids[0], scores[0])
+            if len(results) >= k or fetch >= total:
+                return results[:k]
+            fetch = min(total, fetch * 4)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, collection_name: str = "default", **kwargs) -> "FaissVectorStore":
+        store = cls(collection_name, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def get_metrics(self) -> Dict:
+        snap = self._snapshot
+        return {
+            "kind": snap.kind if snap else None,
+            "version": snap.version if snap else 0,
+            "vectors": snap.index.ntotal if snap else 0,
+            "live": self._table.count(),
+            "unpublished": self._unpublished,
+        }
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            self._snapshot = None
+            self._draft = None
+            self._table.close()
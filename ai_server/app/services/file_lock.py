@@ -0,0 +1,29 @@
+# app/services/file_lock.py
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): only run one writing process per store there
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive advisory lock on path (created if missing), shared by every
+    process on the host that writes the same on-disk store. Each call opens its
+    own file description, so threads of one process exclude each other too.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
@@ -1,15 +1,28 @@
 # app/services/generators.py
-import re
-from typing import List, Optional, Dict
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, List, Optional, Dict, Tuple
 from pydantic import ValidationError
 from app.services.llm import LLMProvider
-from app.services.json_utils import extract_json_from_text
+from app.services.json_utils import extract_json_from_text, StreamingJSONParser
 from app.schemas.generators import (
-    MCQResponse, FlashcardsResponse, TestResponse, SummarizeResponse, RAGResponse
+    MCQ, MCQResponse, FlashcardItem, FlashcardsResponse, TestResponse, SummarizeResponse, RAGResponse
 )
-from app.db.supabase_client import fetch_processed_sources
-from app.services.loader import download_bytes, bytes_to_text
+from app.db.supabase_client import stream_source_pages, count_sources, latest_processed_at
+from app.services.loader import download_to_file, file_to_text
 from app.services.retriever import get_contexts_for_query
+from app.services.context_packer import (
+    pack_contexts, split_label, CONTEXT_SEPARATOR, GENERATOR_CONTEXT_TOKENS, RAG_CONTEXT_TOKENS
+)
+from app.services.text_cache import text_cache
+from app.services.topic_cache import topic_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-request fan-out for per-topic generation (the global cap lives in llm.py)
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+GENERATION_TOPIC_RETRIES = int(os.getenv("GENERATION_TOPIC_RETRIES", "1"))
 
 # -------------------
 # PROMPT TEMPLATES
@@ -134,57 +147,169 @@ async def get_topics(
     else:
         return []
 
-def build_prompt(base_prompt: str, topic: str, n: int, contexts: Optional[List[str]] = None) -> str:
-    """Build prompt with optional context"""
+def build_prompt(base_prompt: str, topic: str, n: int, contexts: Optional[List[str]] = None, model: Optional[str] = None) -> str:
+    """Build prompt with optional context, packed into GENERATOR_CONTEXT_TOKENS for the model"""
     prompt = base_prompt.format(n=n, topic=topic)
-    if contexts:
-        joined_ctx = "\n\n---\n\n".join(contexts[:6])
+    packed = pack_contexts(contexts, GENERATOR_CONTEXT_TOKENS, model=model) if contexts else []
+    if packed:
+        joined_ctx = CONTEXT_SEPARATOR.join(packed)
         prompt += f"\n\nCONTEXT:\n{joined_ctx}"
     return prompt
 
-async def run_and_validate(provider_obj, system_prompt, user_prompt, schema_cls):
-    """Run LLM and validate against schema"""
-    raw = await provider_obj.generate(system_prompt, user_prompt)
-    parsed = extract_json_from_text(raw)
+async def validate_output(provider_obj, system_prompt, user_prompt, raw: str, schema_cls, cache_endpoint: Optional[str] = None):
+    """Parse raw model output and validate it against schema_cls"""
     try:
+        parsed = extract_json_from_text(raw)
         validated = schema_cls(**parsed)
-        return validated.dict()
-    except ValidationError as e:
-        raise RuntimeError(f"{schema_cls.__name__} validation failed: {e}\nRAW OUTPUT:\n{raw}")
+    except ValueError as e:
+        # Never keep serving a cached answer that didn't parse or validate
+        if cache_endpoint:
+            await provider_obj.forget(system_prompt, user_prompt)
+        if isinstance(e, ValidationError):
+            raise RuntimeError(f"{schema_cls.__name__} validation failed: {e}\nRAW OUTPUT:\n{raw}")
+        raise
+    return validated.dict()
+
+async def run_and_validate(provider_obj, system_prompt, user_prompt, schema_cls, cache_endpoint: Optional[str] = None):
+    """Run LLM and validate against schema"""
+    raw = await provider_obj.generate(system_prompt, user_prompt, cache_endpoint=cache_endpoint)
+    return await validate_output(provider_obj, system_prompt, user_prompt, raw, schema_cls, cache_endpoint)
+
+async def fan_out_topics(
+    jobs: List[Tuple[str, int]],
+    run_one,
+    max_concurrency: int = GENERATION_CONCURRENCY,
+    retries: int = GENERATION_TOPIC_RETRIES
+) -> Tuple[List, List[Dict]]:
+    """
+    Run run_one(topic, count) for every job with bounded concurrency.
+    Returns (items in job order, per-topic failures). A failing topic is retried
+    and then reported instead of failing the whole request; only if every topic
+    fails is an error raised.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(topic: str, count: int):
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    return await run_one(topic, count)
+                except Exception as e:
+                    if attempt >= retries:
+                        raise
+                    logger.warning(f"Generation for topic '{topic}' failed (attempt {attempt + 1}), retrying: {e}")
+
+    results = await asyncio.gather(*[run(t, c) for t, c in jobs], return_exceptions=True)
+
+    items, failures = [], []
+    for (t, _), r in zip(jobs, results):
+        if isinstance(r, BaseException):
+            logger.error(f"Generation for topic '{t}' failed: {r}")
+            failures.append({"topic": t, "error": str(r)})
+        else:
+            items.extend(r)
+
+    if failures and len(failures) == len(jobs):
+        raise RuntimeError(failures[0]["error"])
+    return items, failures
+
+async def retrieve_default_contexts(
+    resolved_topics: List[str],
+    contexts: Optional[List[str]],
+    use_retriever: bool,
+    studyKitId: Optional[str] = None
+) -> Optional[List[str]]:
+    """Caller-supplied contexts, else retriever contexts for the first topic (scoped to the kit)"""
+    if contexts is None and use_retriever and resolved_topics:
+        try:
+            contexts = await asyncio.to_thread(get_contexts_for_query, resolved_topics[0], k=4, studyKitId=studyKitId)
+        except Exception:
+            contexts = None
+    return contexts
+
+async def _load_source_text(row: Dict, max_chars: Optional[int] = None) -> Optional[str]:
+    """Extracted text for a source row: the local text cache first, the network only on a miss"""
+    source_id = row.get("id")
+    text = await asyncio.to_thread(text_cache.get, source_id, max_chars)
+    if text is not None:
+        return text
+
+    url = row.get("fileUrl")
+    if not url:
+        return None
+    with await download_to_file(url) as downloaded:
+        text, detected_type = await asyncio.to_thread(file_to_text, url, downloaded.path)
+        if text and text.strip():
+            await asyncio.to_thread(
+                text_cache.put, source_id, downloaded.sha256, text,
+                file_type=detected_type, etag=downloaded.etag
+            )
+    return text[:max_chars] if max_chars else text
 
 async def extract_key_topics(studyKitId: Optional[str] = None, k: int = 8, provider: str = "openai"):
-    """Extract key topics from processed sources"""
-    rows = fetch_processed_sources(studyKitId)
-    if not rows:
+    """Extract key topics from processed sources (memoized per kit and source set)"""
+    # The source set is identified by its size and last processing time, not by listing it
+    count, latest = await asyncio.gather(
+        asyncio.to_thread(count_sources, studyKitId, True),
+        asyncio.to_thread(latest_processed_at, studyKitId),
+    )
+    if not count:
         return {"topics": []}
 
-    # Build a sample: for each source take first 1200 chars
+    cache_key = topic_cache.make_key(studyKitId, k, provider, (count, latest))
+    cached = topic_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Build a sample: for each source take first 1200 chars, reading pages only until it is full
     pieces = []
+    sample_size = 0
     max_sample_size = 15000
-    for r in rows:
-        url = r.get("fileUrl")
-        if not url:
-            continue
-        try:
-            b = download_bytes(url)
-            text, _ = bytes_to_text(url, b)
-            snippet = (text[:1200] + "...") if len(text) > 1200 else text
-            pieces.append(f"--- {r.get('fileName') or r.get('id')} ---\n{snippet}\n")
-        except Exception:
-            continue
-        if sum(len(p) for p in pieces) > max_sample_size:
-            break
+    # Only the columns needed to load text and label it; the next page is fetched ahead
+    pages = stream_source_pages(("id", "fileUrl", "fileName"), studyKitId=studyKitId, processed=True)
+    try:
+        async for page in pages:
+            for r in page:
+                try:
+                    text = await _load_source_text(r, max_chars=1201)
+                    if not text:
+                        continue
+                    snippet = (text[:1200] + "...") if len(text) > 1200 else text
+                    pieces.append(f"--- {r.get('fileName') or r.get('id')} ---\n{snippet}\n")
+                    sample_size += len(pieces[-1])
+                except Exception:
+                    continue
+                if sample_size > max_sample_size:
+                    break
+            if sample_size > max_sample_size:
+                break
+    finally:
+        # Stops the read-ahead of the next page
+        await pages.aclose()
 
     sample_text = "\n\n".join(pieces)[:max_sample_size]
     user_prompt = TOPIC_EXTRACTION_PROMPT.format(sample_text=sample_text, k=k)
     provider_obj = LLMProvider(provider=provider, temperature=0.0)
-    raw = await provider_obj.generate("Extract topics only and output strict JSON.", user_prompt)
-    parsed = extract_json_from_text(raw)
+    system_prompt = "Extract topics only and output strict JSON."
+    raw = await provider_obj.generate(system_prompt, user_prompt, cache_endpoint="topics")
+    try:
+        parsed = extract_json_from_text(raw)
+    except ValueError:
+        await provider_obj.forget(system_prompt, user_prompt)
+        raise
     topics = parsed.get("topics", []) if isinstance(parsed, dict) else []
+    if topics:
+        topic_cache.set(cache_key, {"topics": topics})
     return {"topics": topics}
 
 # ---- Main Generator Functions ----
 
+def _mcq_jobs(resolved_topics: List[str], n: int) -> List[Tuple[str, int]]:
+    num_topics = len(resolved_topics)
+    per = max(1, n // num_topics)
+    rem = n - (per * num_topics)
+    return [(t, per + (1 if i < rem else 0)) for i, t in enumerate(resolved_topics)]
+
 async def generate_mcqs_llm(
     topic: Optional[str] = None,
     n: int = 5,
@@ -201,35 +326,27 @@ async def generate_mcqs_llm(
         return {"mcqs": []}
 
     # Get contexts if needed
-    if contexts is None and use_retriever and resolved_topics:
-        try:
-            contexts = get_contexts_for_query(resolved_topics[0], k=4)
-        except Exception:
-            contexts = None
+    contexts = await retrieve_default_contexts(resolved_topics, contexts, use_retriever, studyKitId)
 
     # Distribute questions across topics
-    num_topics = len(resolved_topics)
-    per = max(1, n // num_topics)
-    rem = n - (per * num_topics)
+    jobs = _mcq_jobs(resolved_topics, n)
 
-    aggregated = {"mcqs": []}
     provider_obj = LLMProvider(provider=provider, temperature=0.25)
 
-    for i, t in enumerate(resolved_topics):
-        count = per + (1 if i < rem else 0)
-        if count <= 0:
-            continue
-
-        prompt = build_prompt(MCQ_PROMPT, topic=t, n=count, contexts=contexts)
+    async def run_one(t: str, count: int):
+        prompt = build_prompt(MCQ_PROMPT, topic=t, n=count, contexts=contexts, model=provider_obj.model)
         raw = await provider_obj.generate("Generate MCQs JSON", prompt)
         parsed = extract_json_from_text(raw)
 
         try:
-            validated = MCQResponse(**parsed)
-            aggregated["mcqs"].extend(validated.mcqs)
+            return MCQResponse(**parsed).mcqs
         except ValidationError as e:
             raise RuntimeError(f"MCQ validation failed for topic '{t}': {e}\nRAW OUTPUT:\n{raw}")
 
+    mcqs, failures = await fan_out_topics(jobs, run_one)
+    aggregated = {"mcqs": mcqs}
+    if failures:
+        aggregated["failed_topics"] = failures
     return aggregated
 
 async def generate_flashcards_llm(
@@ -246,27 +363,25 @@ async def generate_flashcards_llm(
     if not resolved_topics:
         return {"flashcards": []}
 
-    if contexts is None and use_retriever and resolved_topics:
-        try:
-            contexts = get_contexts_for_query(resolved_topics[0], k=4)
-        except Exception:
-            contexts = None
+    contexts = await retrieve_default_contexts(resolved_topics, contexts, use_retriever, studyKitId)
 
-    aggregated = {"flashcards": []}
     per_topic = max(1, n // len(resolved_topics))
     provider_obj = LLMProvider(provider=provider, temperature=0.3)
 
-    for t in resolved_topics:
-        prompt = build_prompt(FLASHCARD_PROMPT, t, per_topic, contexts)
+    async def run_one(t: str, count: int):
+        prompt = build_prompt(FLASHCARD_PROMPT, t, count, contexts, model=provider_obj.model)
         raw = await provider_obj.generate("Generate Flashcards JSON", prompt)
         parsed = extract_json_from_text(raw)
         
         try:
-            validated = FlashcardsResponse(**parsed)
-            aggregated["flashcards"].extend(validated.flashcards)
+            return FlashcardsResponse(**parsed).flashcards
         except ValidationError as e:
             raise RuntimeError(f"Flashcard validation failed for topic '{t}': {e}\nRAW OUTPUT:\n{raw}")
 
+    flashcards, failures = await fan_out_topics([(t, per_topic) for t in resolved_topics], run_one)
+    aggregated = {"flashcards": flashcards}
+    if failures:
+        aggregated["failed_topics"] = failures
     return aggregated
 
 async def create_test_llm(
@@ -287,25 +402,28 @@ async def create_test_llm(
     if not topics:
         return {"test": []}
 
-    aggregated = {"test": []}
     per_topic = max(1, n // len(topics))
+    provider_obj = LLMProvider(provider=provider, temperature=0.4)
+    packed = pack_contexts(contexts, GENERATOR_CONTEXT_TOKENS, model=provider_obj.model) if contexts else []
 
-    for t in topics:
-        user_prompt = TEST_PROMPT.format(n=per_topic, topic=t, difficulty=difficulty)
-        if contexts:
-            joined_ctx = "\n\n---\n\n".join(contexts[:6])
+    async def run_one(t: str, count: int):
+        user_prompt = TEST_PROMPT.format(n=count, topic=t, difficulty=difficulty)
+        if packed:
+            joined_ctx = CONTEXT_SEPARATOR.join(packed)
             user_prompt += f"\n\nCONTEXT:\n{joined_ctx}"
 
-        provider_obj = LLMProvider(provider=provider, temperature=0.4)
         raw = await provider_obj.generate("Generate Test JSON", user_prompt)
         parsed = extract_json_from_text(raw)
 
         try:
-            validated = TestResponse(**parsed)
-            aggregated["test"].extend(validated.test)
+            return TestResponse(**parsed).test
         except ValidationError as e:
             raise RuntimeError(f"Test validation failed: {e}\nRAW:\n{raw}")
 
+    items, failures = await fan_out_topics([(t, per_topic) for t in topics], run_one)
+    aggregated = {"test": items}
+    if failures:
+        aggregated["failed_topics"] = failures
     return aggregated
 
 async def summarize_llm(text: str, provider: str = "openai") -> dict:
@@ -313,36 +431,27 @@ async def summarize_llm(text: str, provider: str = "openai") -> dict:
     provider_obj = LLMProvider(provider=provider, temperature=0.0)
     system_prompt = "You are a summarizer. Output only strict JSON with a summary field."
     user_prompt = SUMMARIZE_PROMPT.format(text=text)
-    return await run_and_validate(provider_obj, system_prompt, user_prompt, SummarizeResponse)
+    return await run_and_validate(provider_obj, system_prompt, user_prompt, SummarizeResponse, cache_endpoint="summarize")
 
-async def rag_chat_with_retriever_only(
+def build_rag_prompts(
     query: str,
-    provider: str = "openai",
-    k: int = 4,
-    collection: Optional[str] = None,
-    max_chars_per_doc: int = 2000
-) -> dict:
-    """RAG chat with retriever context only"""
-    # Fetch contexts
-    contexts = get_contexts_for_query(query, k=k, collection_name=collection)
-    if not contexts:
-        return {"answer": "I don't know — no relevant context found.", "citations": []}
+    contexts: List[str],
+    model: Optional[str] = None,
+    context_tokens: int = RAG_CONTEXT_TOKENS,
+    max_chars_per_doc: Optional[int] = None
+) -> Tuple[str, str, List[str]]:
+    """System prompt, user prompt and the source labels of the numbered contexts"""
+    # Dedupe overlapping chunks and fit the passages into the model's context budget
+    packed = pack_contexts(contexts, context_tokens, model=model, max_chars_per_doc=max_chars_per_doc)
 
     # Build numbered context
     context_pieces = []
     citation_labels = []
-    for i, ctx in enumerate(contexts, start=1):
+    for i, ctx in enumerate(packed, start=1):
         # Extract label if present
-        m = re.match(r"^\s*\[(?P<label>[^\]]+)\]\s*(?P<body>.*)$", ctx, flags=re.DOTALL)
-        if m:
-            label = m.group("label").strip()
-            body = m.group("body").strip()
-        else:
-            label = f"doc_{i}"
-            body = ctx.strip()
-
-        snippet = body[:max_chars_per_doc].strip()
-        context_pieces.append(f"[{i}] Source: {label}\n{snippet}")
+        label, body = split_label(ctx)
+        label = label or f"doc_{i}"
+        context_pieces.append(f"[{i}] Source: {label}\n{body}")
         citation_labels.append(label)
 
     joined_context = "\n\n---\n\n".join(context_pieces)
@@ -367,5 +476,220 @@ async def rag_chat_with_retriever_only(
         " 4) Output ONLY the JSON object (no markdown, no code fences, no extra commentary).\n"
     )
 
+    return system_prompt, user_prompt, citation_labels
+
+async def rag_chat_with_retriever_only(
+    query: str,
+    provider: str = "openai",
+    k: int = 4,
+    collection: Optional[str] = None,
+    max_chars_per_doc: Optional[int] = None,
+    studyKitId: Optional[str] = None,
+    context_tokens: int = RAG_CONTEXT_TOKENS
+) -> dict:
+    """RAG chat with retriever context only (scoped to one study kit when studyKitId is given)"""
+    # Fetch contexts
+    contexts = await asyncio.to_thread(
+        get_contexts_for_query, query, k=k, collection_name=collection, studyKitId=studyKitId
+    )
+    if not contexts:
+        return {"answer": "I don't know — no relevant context found.", "citations": []}
+
+    provider_obj = LLMProvider(provider=provider, temperature=0.0)
+    system_prompt, user_prompt, _ = build_rag_prompts(
+        query, contexts, provider_obj.model, context_tokens, max_chars_per_doc
+    )
+    return await run_and_validate(provider_obj, system_prompt, user_prompt, RAGResponse, cache_endpoint="rag")
+
+# ---- Streaming (server-sent events) ----
+# These yield (event, data) pairs: "sources", "delta" / "item", then "done" with the
+# validated result. Errors are raised; app/api/sse.py sends them as an "error" event.
+
+async def stream_validated_text(
+    provider_obj,
+    system_prompt: str,
+    user_prompt: str,
+    text_key: str,
+    schema_cls,
+    cache_endpoint: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Stream the decoded characters of one JSON string field, then the validated object"""
+    parser = StreamingJSONParser(text_key=text_key)
+    async for delta in provider_obj.stream(system_prompt, user_prompt, cache_endpoint=cache_endpoint):
+        for _, text in parser.feed(delta):
+            yield "delta", {"text": text}
+    result = await validate_output(provider_obj, system_prompt, user_prompt, parser.text, schema_cls, cache_endpoint)
+    yield "done", result
+
+async def stream_topic_items(
+    provider_obj,
+    jobs: List[Tuple[str, int]],
+    system_prompt: str,
+    build_user_prompt,
+    items_key: str,
+    item_cls,
+    response_cls,
+    max_concurrency: int = GENERATION_CONCURRENCY,
+    retries: int = GENERATION_TOPIC_RETRIES
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming counterpart of fan_out_topics: topics run concurrently and each
+    item is yielded as soon as its JSON object closes in the model output.
+    Every topic's full output is still validated against response_cls; the
+    "done" event carries the validated items in job order plus failed_topics.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(topic: str, count: int):
+        async with semaphore:
+            for attempt in range(retries + 1):
+                sent = 0
+                try:
+                    parser = StreamingJSONParser(items_key=items_key)
+                    async for delta in provider_obj.stream(system_prompt, build_user_prompt(topic, count)):
+                        for _, obj in parser.feed(delta):
+                            try:
+                                item = item_cls(**obj).dict()
+                            except (ValidationError, TypeError):
+                                continue  # reported by the final validation
+                            sent += 1
+                            await queue.put(("item", {"topic": topic, "item": item}))
+                    parsed = extract_json_from_text(parser.text)
+                    try:
+                        return getattr(response_cls(**parsed), items_key)
+                    except ValidationError as e:
+                        raise RuntimeError(f"{response_cls.__name__} validation failed for topic '{topic}': {e}")
+                except Exception as e:
+                    # Items already sent can't be taken back, so only retry a topic that sent none
+                    if attempt >= retries or sent:
+                        raise
+                    logger.warning(f"Streaming generation for topic '{topic}' failed (attempt {attempt + 1}), retrying: {e}")
+
+    tasks = [asyncio.create_task(run(t, c)) for t, c in jobs]
+
+    async def close_queue():
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await queue.put(None)
+
+    closer = asyncio.create_task(close_queue())
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        # Client went away: stop generating for it
+        for task in tasks:
+            task.cancel()
+        closer.cancel()
+
+    items, failures = [], []
+    for (t, _), task in zip(jobs, tasks):
+        error = task.exception()
+        if error is not None:
+            logger.error(f"Streaming generation for topic '{t}' failed: {error}")
+            failures.append({"topic": t, "error": str(error)})
+        else:
+            items.extend(i.dict() for i in task.result())
+    if failures and len(failures) == len(jobs):
+        raise RuntimeError(failures[0]["error"])
+
+    done = {items_key: items}
+    if failures:
+        done["failed_topics"] = failures
+    yield "done", done
+
+async def stream_mcqs_llm(
+    topic: Optional[str] = None,
+    n: int = 5,
+    provider: str = "openai",
+    contexts: Optional[List[str]] = None,
+    topics: Optional[List[str]] = None,
+    studyKitId: Optional[str] = None,
+    use_retriever: bool = True,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """generate_mcqs_llm, sending each MCQ as soon as the model finishes it"""
+    resolved_topics = await get_topics(topic, topics, studyKitId, provider)
+    if not resolved_topics:
+        yield "done", {"mcqs": []}
+        return
+    yield "topics", {"topics": resolved_topics}
+
+    contexts = await retrieve_default_contexts(resolved_topics, contexts, use_retriever, studyKitId)
+    provider_obj = LLMProvider(provider=provider, temperature=0.25)
+
+    def user_prompt(t: str, count: int) -> str:
+        return build_prompt(MCQ_PROMPT, topic=t, n=count, contexts=contexts, model=provider_obj.model)
+
+    async for event in stream_topic_items(
+        provider_obj, _mcq_jobs(resolved_topics, n), "Generate MCQs JSON", user_prompt, "mcqs", MCQ, MCQResponse
+    ):
+        yield event
+
+async def stream_flashcards_llm(
+    topic: Optional[str] = None,
+    n: int = 5,
+    provider: str = "openai",
+    contexts: Optional[List[str]] = None,
+    topics: Optional[List[str]] = None,
+    studyKitId: Optional[str] = None,
+    use_retriever: bool = True,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """generate_flashcards_llm, sending each flashcard as soon as the model finishes it"""
+    resolved_topics = await get_topics(topic, topics, studyKitId, provider)
+    if not resolved_topics:
+        yield "done", {"flashcards": []}
+        return
+    yield "topics", {"topics": resolved_topics}
+
+    contexts = await retrieve_default_contexts(resolved_topics, contexts, use_retriever, studyKitId)
+    per_topic = max(1, n // len(resolved_topics))
+    provider_obj = LLMProvider(provider=provider, temperature=0.3)
+
+    def user_prompt(t: str, count: int) -> str:
+        return build_prompt(FLASHCARD_PROMPT, t, count, contexts, model=provider_obj.model)
+
+    async for event in stream_topic_items(
+        provider_obj, [(t, per_topic) for t in resolved_topics], "Generate Flashcards JSON", user_prompt,
+        "flashcards", FlashcardItem, FlashcardsResponse
+    ):
+        yield event
+
+async def stream_summarize_llm(text: str, provider: str = "openai") -> AsyncIterator[Tuple[str, Any]]:
+    """summarize_llm, streaming the summary text as it is generated"""
     provider_obj = LLMProvider(provider=provider, temperature=0.0)
-    return await run_and_validate(provider_obj, system_prompt, user_prompt, RAGResponse)
\ No newline at end of file
+    system_prompt = "You are a summarizer. Output only strict JSON with a summary field."
+    user_prompt = SUMMARIZE_PROMPT.format(text=text)
+    async for event in stream_validated_text(
+        provider_obj, system_prompt, user_prompt, "summary", SummarizeResponse, cache_endpoint="summarize"
+    ):
+        yield event
+
+async def stream_rag_chat(
+    query: str,
+    provider: str = "openai",
+    k: int = 4,
+    collection: Optional[str] = None,
+    max_chars_per_doc: Optional[int] = None,
+    studyKitId: Optional[str] = None,
+    context_tokens: int = RAG_CONTEXT_TOKENS
+) -> AsyncIterator[Tuple[str, Any]]:
+    """rag_chat_with_retriever_only, streaming the answer text as it is generated"""
+    contexts = await asyncio.to_thread(
+        get_contexts_for_query, query, k=k, collection_name=collection, studyKitId=studyKitId
+    )
+    if not contexts:
+        yield "done", {"answer": "I don't know — no relevant context found.", "citations": []}
+        return
+
+    provider_obj = LLMProvider(provider=provider, temperature=0.0)
+    system_prompt, user_prompt, labels = build_rag_prompts(
+        query, contexts, provider_obj.model, context_tokens, max_chars_per_doc
+    )
+    yield "sources", {"sources": labels}
+    async for event in stream_validated_text(
+        provider_obj, system_prompt, user_prompt, "answer", RAGResponse, cache_endpoint="rag"
+    ):
+        yield event
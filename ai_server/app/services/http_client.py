@@ -0,0 +1,103 @@
+# app/services/http_client.py
+import os
+import asyncio
+import importlib.util
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class SharedHttpClient:
+    """
+    One application-scoped httpx.AsyncClient with keep-alive pooling.
+    Started/closed from the FastAPI lifespan; created lazily if used outside it.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.metrics = {"requests": 0, "connections_opened": 0, "errors": 0}
+
+    async def start(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=HTTP_TIMEOUT,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+            logger.info("Shared HTTP client started (http2=%s)", HTTP2_AVAILABLE)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._host_slots.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+            self._host_slots[host] = sem
+        return sem
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore emits connect_tcp only when a new connection is opened
+        if event_name == "connection.connect_tcp.complete":
+            self.metrics["connections_opened"] += 1
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        """client.stream() bounded by the per-host connection limit"""
+        client = await self.start()
+        extensions = {**kwargs.pop("extensions", {}), "trace": self._trace}
+        async with self._host_slot(url):
+            self.metrics["requests"] += 1
+            try:
+                async with client.stream(method, url, extensions=extensions, **kwargs) as response:
+                    yield response
+            except httpx.HTTPError:
+                self.metrics["errors"] += 1
+                raise
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        client = await self.start()
+        extensions = {**kwargs.pop("extensions", {}), "trace": self._trace}
+        async with self._host_slot(url):
+            self.metrics["requests"] += 1
+            try:
+                return await client.get(url, extensions=extensions, **kwargs)
+            except httpx.HTTPError:
+                self.metrics["errors"] += 1
+                raise
+
+    def get_metrics(self) -> Dict:
+        requests = self.metrics["requests"]
+        opened = self.metrics["connections_opened"]
+        return {
+            **self.metrics,
+            "connections_reused": max(0, requests - opened),
+            "http2": HTTP2_AVAILABLE,
+            "started": self._client is not None,
+        }
+
+# Global instance
+http_client = SharedHttpClient()
@@ -0,0 +1,263 @@
+# app/services/ingest_worker.py
+"""
+Worker pool that runs queued ingestion jobs outside the API process.
+
+The API starts INGEST_WORKERS worker processes from its lifespan. To run them
+separately (another container or host sharing the same stores), set
+INGEST_START_WORKERS=0 for the API and start:
+
+    cd ai_server
+    python -m app.services.ingest_worker --workers 2
+
+Each worker process claims one job at a time from the SQLite job queue,
+reports progress through heartbeats and stops early when the job is cancelled.
+Throughput scales with --workers; API latency is unaffected because no
+ingestion runs in the API process. Sources of a cancelled or crashed job that
+were embedded but not yet marked are cheap to redo: unchanged chunks are skipped.
+
+All workers write the same on-disk stores (vector store, lexical index,
+embedding cache). Writers take a per-store flock (see file_lock.py) and catch
+up with other processes' writes before writing. Without fcntl (Windows) run a
+single worker.
+"""
+import os
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import threading
+import logging
+import multiprocessing
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Whether the API process starts the worker pool itself (0 when it runs as its own process)
+INGEST_START_WORKERS = os.getenv("INGEST_START_WORKERS", "1") == "1"
+# How long a stopping pool waits for workers to finish their current job before killing them
+INGEST_WORKER_STOP_TIMEOUT = float(os.getenv("INGEST_WORKER_STOP_TIMEOUT", "30"))
+# How often a running job renews its lease, saves progress and checks for cancellation
+INGEST_HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", "5"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
+
+JOB_PENDING = "ingest_pending"
+JOB_STUDY_KIT = "ingest_study_kit"
+
+
+class _Progress:
+    """Per-job counters updated from ingestion_manager's on_progress callback"""
+
+    def __init__(self):
+        self.data: Dict = {
+            "sources_total": 0, "sources_done": 0, "sources_succeeded": 0,
+            "sources_failed": 0, "sources_skipped": 0, "chunks_embedded": 0,
+        }
+
+    def __call__(self, done: int, total: int, result: Optional[Dict]):
+        self.data["sources_total"] = total
+        self.data["sources_done"] = done
+        if result is None:
+            return
+        status = result.get("status")
+        if status == "success":
+            self.data["sources_succeeded"] += 1
+            self.data["chunks_embedded"] += result.get("chunks_written", 0)
+        elif status == "skipped":
+            self.data["sources_skipped"] += 1
+        else:
+            self.data["sources_failed"] += 1
+
+
+async def run_job(job: Dict, progress: _Progress) -> Dict:
+    from app.services.ingestion_manager import ingestion_manager
+
+    payload = job["payload"]
+    # One job at a time per process, so setting the collection here is safe
+    ingestion_manager.collection_name = payload.get("collection_name")
+    if job["kind"] == JOB_PENDING:
+        return await ingestion_manager.ingest_pending_sources(
+            limit=payload.get("limit", 50),
+            max_concurrency=payload.get("max_concurrency", 5),
+            on_progress=progress
+        )
+    if job["kind"] == JOB_STUDY_KIT:
+        return await ingestion_manager.ingest_study_kit_sources(
+            studyKitId=payload["studyKitId"],
+            max_concurrency=payload.get("max_concurrency", 5),
+            reingest=payload.get("reingest", False),
+            on_progress=progress
+        )
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+async def _execute(queue, job: Dict, worker: str):
+    progress = _Progress()
+    from app.services.job_queue import HEARTBEAT_CANCEL, HEARTBEAT_LOST
+
+    task = asyncio.create_task(run_job(job, progress))
+    cancelled = lost = False
+    while not task.done():
+        await asyncio.wait({task}, timeout=INGEST_HEARTBEAT_SECONDS)
+        if task.done():
+            break
+        if cancelled or lost:
+            continue
+        try:
+            beat = await asyncio.to_thread(queue.heartbeat, job["id"], worker, progress.data)
+        except Exception as e:
+            # e.g. "database is locked"; the lease outlasts a few missed heartbeats
+            logger.warning(f"Heartbeat for job {job['id']} failed, retrying next tick: {e}")
+            continue
+        if beat == HEARTBEAT_LOST:
+            # Another worker may already be running it; stop instead of racing it
+            logger.warning(f"Job {job['id']} lease lost (heartbeats too late); stopping")
+            lost = True
+            task.cancel()
+        elif beat == HEARTBEAT_CANCEL:
+            logger.info(f"Job {job['id']} cancelled; stopping")
+            cancelled = True
+            task.cancel()
+
+    if lost:
+        # The job row belongs to its new run now; don't record anything for this one
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Job {job['id']} failed after losing its lease: {task.exception()}")
+        return
+    try:
+        result = task.result()
+    except asyncio.CancelledError:
+        await asyncio.to_thread(queue.mark_cancelled, job["id"], worker, progress.data)
+        return
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed (attempt {job['attempts']}/{job['max_attempts']}): {e}")
+        await asyncio.to_thread(queue.fail, job["id"], worker, str(e), progress.data)
+        return
+    if cancelled:
+        # Finished before the cancellation reached it
+        logger.info(f"Job {job['id']} completed before it could be cancelled")
+    # Per-source details stay in the logs; the job keeps the totals
+    result.pop("results", None)
+    await asyncio.to_thread(queue.complete, job["id"], worker, result, progress.data)
+
+
+async def worker_loop(worker: str, stop: asyncio.Event):
+    from app.services.job_queue import job_queue
+    from app.services.http_client import http_client
+    from app.services.embedding_writer import embedding_writer
+    from app.services.status_writer import status_writer
+    from app.services.vectorstore import vectorstore_manager
+    from app.services.lexical_index import lexical_index
+    from app.services.extraction import extraction_engine
+
+    await http_client.start()
+    logger.info(f"Ingest worker {worker} started")
+    try:
+        while not stop.is_set():
+            job = await asyncio.to_thread(job_queue.claim, worker)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=INGEST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info(f"Worker {worker} running job {job['id']} ({job['kind']})")
+            await _execute(job_queue, job, worker)
+    finally:
+        # Same shutdown order as the API lifespan
+        await embedding_writer.close()
+        await status_writer.close()
+        vectorstore_manager.close()
+        lexical_index.close()
+        await http_client.close()
+        extraction_engine.shutdown()
+        job_queue.close()
+        logger.info(f"Ingest worker {worker} stopped")
+
+
+def _worker_main(index: int):
+    logging.basicConfig(level=logging.INFO)
+    worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Finish the current job, then exit; a killed worker's job is requeued once its lease expires
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await worker_loop(worker, stop)
+
+    asyncio.run(main())
+
+
+class WorkerPool:
+    """Worker processes, restarted by a supervisor thread whenever one dies, until stop()"""
+
+    def __init__(self, workers: int = INGEST_WORKERS):
+        self.workers = max(1, workers)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: Dict[int, multiprocessing.Process] = {}
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    def start(self):
+        self._ensure_workers()
+        self._supervisor = threading.Thread(target=self._supervise, name="ingest-pool", daemon=True)
+        self._supervisor.start()
+        logger.info(f"Started {self.workers} ingest workers")
+
+    def _ensure_workers(self):
+        for i in range(self.workers):
+            proc = self._procs.get(i)
+            if proc is None or not proc.is_alive():
+                if proc is not None:
+                    logger.warning(f"Ingest worker {i} exited with {proc.exitcode}; restarting")
+                self._procs[i] = self._ctx.Process(target=_worker_main, args=(i,), name=f"ingest-worker-{i}")
+                self._procs[i].start()
+
+    def _supervise(self):
+        while not self._stopping.wait(1):
+            self._ensure_workers()
+
+    def stop(self, timeout: Optional[float] = INGEST_WORKER_STOP_TIMEOUT):
+        """SIGTERM the workers (they finish their current job) and kill any still running after timeout"""
+        self._stopping.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+        for proc in self._procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for proc in self._procs.values():
+            proc.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                # Its job is requeued once the lease expires
+                logger.warning(f"Ingest worker {proc.name} did not stop in time; killing it")
+                proc.kill()
+                proc.join()
+
+
+def run_pool(workers: int = INGEST_WORKERS):
+    """Start the worker processes and restart any that die until SIGTERM/SIGINT"""
+    stopping = threading.Event()
+
+    def stop(*_):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    pool = WorkerPool(workers)
+    pool.start()
+    while not stopping.wait(1):
+        pass
+    pool.stop(timeout=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_pool(args.workers)
@@ -160,33 +160,187 @@
 
 # app/services/ingestion_manager.py
 import asyncio
-from typing import List, Dict, Optional
+import os
+import time
+import uuid
+import socket
+from typing import Callable, List, Dict, Optional
 from app.db.supabase_client import (
-    fetch_unprocessed_sources, 
-    mark_source_processed, 
-    get_sources_by_study_kit
+    claim_sources,
+    renew_source_leases,
+    release_source_leases,
+    count_sources,
+    SOURCE_PAGE_SIZE
 )
-from app.services.loader import download_bytes, bytes_to_text
-# NOTE: changed import to use the Chroma-backed function but keep the old name for compatibility
-from app.services.vectorstore import chunk_text_into_docs, upsert_documents_to_vectorstore as upsert_documents_to_pgvector
+from app.services.loader import download_to_file, file_to_text, DownloadedFile
+from app.services.text_cache import text_cache
+from app.services.topic_cache import topic_cache
+from app.services.vectorstore import chunk_text_into_docs, diff_source_documents, delete_chunks
+from app.services.embedding_writer import embedding_writer
+from app.services.status_writer import status_writer
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Per-stage concurrency limits. Network stages can run wide, CPU-bound stages
+# are kept narrow so one ingestion run can't starve the API. Embedding and
+# storage are batched across sources by the embedding writer (EMBED_BATCH_*).
+DEFAULT_STAGE_LIMITS = {
+    "download": int(os.getenv("INGEST_DOWNLOAD_CONCURRENCY", "8")),
+    "parse": int(os.getenv("INGEST_PARSE_CONCURRENCY", "2")),
+    "chunk": int(os.getenv("INGEST_CHUNK_CONCURRENCY", "4")),
+    "diff": int(os.getenv("INGEST_DIFF_CONCURRENCY", "4")),
+}
+
+# on_progress(done, total, result) is called once with result=None before any source
+# starts, then after every finished source
+ProgressCallback = Callable[[int, int, Optional[Dict]], None]
+
+# Sources are leased while being processed so replicas and workers never take the same row.
+# A crashed worker's rows become claimable again once the lease runs out.
+SOURCE_LEASE_SECONDS = int(os.getenv("SOURCE_LEASE_SECONDS", "300"))
+SOURCE_LEASE_RENEW_SECONDS = float(os.getenv("SOURCE_LEASE_RENEW_SECONDS", str(SOURCE_LEASE_SECONDS / 3)))
+
 class IngestionManager:
-    def __init__(self, collection_name: str = None):
+    def __init__(self, collection_name: str = None, stage_limits: Optional[Dict[str, int]] = None):
         self.collection_name = collection_name
+        self.stage_limits = {**DEFAULT_STAGE_LIMITS, **(stage_limits or {})}
+        self._stage_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Lease owner id, unique per process
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _stage(self, name: str) -> asyncio.Semaphore:
+        """Semaphore bounding how many sources may be inside a stage at once"""
+        sem = self._stage_semaphores.get(name)
+        if sem is None:
+            sem = asyncio.Semaphore(max(1, self.stage_limits.get(name, 1)))
+            self._stage_semaphores[name] = sem
+        return sem
+
+    async def _run_stage(self, name: str, timings: Dict[str, float], func, *args, **kwargs):
+        """Run a blocking stage function in the default executor under its stage limit"""
+        async with self._stage(name):
+            started = time.perf_counter()
+            try:
+                return await asyncio.to_thread(func, *args, **kwargs)
+            finally:
+                timings[name] = round(time.perf_counter() - started, 3)
+
+    async def _download(self, url: str, timings: Dict[str, float]) -> DownloadedFile:
+        async with self._stage("download"):
+            started = time.perf_counter()
+            try:
+                return await download_to_file(url)
+            finally:
+                timings["download"] = round(time.perf_counter() - started, 3)
+
+    @staticmethod
+    def _embedding_hit_rate(results: List) -> float:
+        hits = sum(r.get("embedding_cache_hits", 0) for r in results if isinstance(r, dict))
+        misses = sum(r.get("embedding_cache_misses", 0) for r in results if isinstance(r, dict))
+        return round(hits / (hits + misses), 3) if hits + misses else 0.0
+
+    async def _release_leases(self, source_ids: List[str]):
+        try:
+            await asyncio.to_thread(release_source_leases, self.owner, source_ids)
+        except Exception as e:
+            # Not fatal: the leases expire on their own
+            logger.warning(f"Failed to release leases on {len(source_ids)} sources: {e}")
+
+    async def _claim(self, limit: int, **filters) -> List[Dict]:
+        """Lease up to `limit` sources, one page per claim_sources call"""
+        claimed: List[Dict] = []
+        try:
+            while len(claimed) < limit:
+                want = min(limit - len(claimed), SOURCE_PAGE_SIZE)
+                page = await asyncio.to_thread(
+                    claim_sources, self.owner, limit=want, lease_seconds=SOURCE_LEASE_SECONDS, **filters
+                )
+                claimed.extend(page)
+                if len(page) < want:
+                    # The rest are processed or leased by another worker
+                    break
+        except BaseException:
+            if claimed:
+                await self._release_leases([s.get("id") for s in claimed])
+            raise
+        return claimed
+
+    async def _renew_leases(self, held: set):
+        """Keep the leases of sources still being processed alive"""
+        while True:
+            await asyncio.sleep(SOURCE_LEASE_RENEW_SECONDS)
+            ids = list(held)
+            if not ids:
+                continue
+            try:
+                kept = set(await asyncio.to_thread(renew_source_leases, self.owner, ids, SOURCE_LEASE_SECONDS))
+            except Exception as e:
+                logger.warning(f"Failed to renew source leases: {e}")
+                continue
+            lost = [i for i in ids if i not in kept and i in held]
+            if lost:
+                # The lease ran out and another worker claimed the row; both will process it once
+                held.difference_update(lost)
+                logger.warning(f"Lost the lease on {len(lost)} sources: {lost[:5]}")
+
+    async def _process_with_limit(
+        self, sources: List[Dict], max_concurrency: int, on_progress: Optional[ProgressCallback] = None
+    ) -> List:
+        """Process sources leased by claim_sources, renewing the leases until each one is done"""
+        # Overall cap on sources in flight; the stage limits apply within it
+        semaphore = asyncio.Semaphore(max_concurrency)
+        done = 0
+        if on_progress:
+            on_progress(0, len(sources), None)
+        held = {s.get("id") for s in sources}
+        renewer = asyncio.create_task(self._renew_leases(held))
+
+        async def process_with_semaphore(source):
+            nonlocal done
+            source_id = source.get("id")
+            async with semaphore:
+                result = await self.process_single_source(source)
+            marked = False
+            if result.get("status") == "success":
+                # The processed mark clears the lease when it is flushed; keep renewing until then
+                marked = await status_writer.wait_written(source_id)
+            held.discard(source_id)
+            if not marked:
+                await self._release_leases([source_id])
+            done += 1
+            if on_progress:
+                on_progress(done, len(sources), result)
+            return result
+
+        try:
+            return await asyncio.gather(
+                *[process_with_semaphore(source) for source in sources],
+                return_exceptions=True
+            )
+        finally:
+            renewer.cancel()
+            if held:
+                # Cancelled part way through
+                await self._release_leases(list(held))
     
     async def process_single_source(self, source_record: Dict) -> Dict:
-        """Process a single source record"""
+        """Process a single source record through download -> parse -> chunk -> embed -> store -> mark"""
         source_id = source_record.get("id")
         url = source_record.get("fileUrl")
         file_name = source_record.get("fileName", "unknown")
+        timings: Dict[str, float] = {}
         
         try:
-            # Download and extract text
-            content_bytes = download_bytes(url)
-            text, detected_type = bytes_to_text(url, content_bytes)
+            # Download to a spool file and extract text from it
+            with await self._download(url, timings) as downloaded:
+                text, detected_type = await self._run_stage("parse", timings, file_to_text, url, downloaded.path)
+                if text and text.strip():
+                    # Populate the extracted-text cache so topic extraction never re-downloads
+                    await asyncio.to_thread(
+                        text_cache.put, source_id, downloaded.sha256, text,
+                        file_type=detected_type, etag=downloaded.etag
+                    )
             
             if not text or not text.strip():
                 logger.warning(f"No text extracted from {file_name}")
@@ -194,7 +348,8 @@ class IngestionManager:
                     "source_id": source_id,
                     "status": "skipped",
                     "reason": "no_text_content",
-                    "chunks": 0
+                    "chunks": 0,
+                    "timings": timings
                 }
             
             # Create metadata
@@ -207,14 +362,28 @@ class IngestionManager:
                 "file_size": source_record.get("fileSize")
             }
             
-            # Create document chunks
-            docs = chunk_text_into_docs(text, metadata)
+            # Create document chunks (with deterministic chunk ids)
+            docs = await self._run_stage("chunk", timings, chunk_text_into_docs, text, metadata)
+
+            # Only chunks that are new or changed since the last ingest get embedded and written
+            to_write, stale_ids, unchanged = await self._run_stage(
+                "diff", timings, diff_source_documents, source_id, docs,
+                collection_name=self.collection_name
+            )
             
-            # Store in vector database (this now calls the Chroma-backed implementation)
-            upsert_documents_to_pgvector(docs, collection_name=self.collection_name)
+            # Embed + store; chunks are coalesced with other sources into bulk batches
+            started = time.perf_counter()
+            try:
+                write_result = await embedding_writer.submit(to_write, collection_name=self.collection_name)
+                # Delete chunks that disappeared only after their replacements are stored
+                deleted = await asyncio.to_thread(delete_chunks, stale_ids, collection_name=self.collection_name)
+            finally:
+                timings["embed_store"] = round(time.perf_counter() - started, 3)
             
-            # Mark as processed
-            mark_source_processed(source_id, loader_used=detected_type)
+            # Mark as processed; marks from many sources are written together by the status writer
+            await status_writer.mark_processed(source_id, loader_used=detected_type, owner=self.owner)
+            # The kit's source set changed, so its memoized topics are stale
+            topic_cache.invalidate_kit(source_record.get("studyKitId"))
             
             logger.info(f"Successfully processed {file_name}: {len(docs)} chunks")
             
@@ -222,8 +391,14 @@ class IngestionManager:
                 "source_id": source_id,
                 "status": "success", 
                 "chunks": len(docs),
+                "chunks_written": len(to_write),
+                "chunks_unchanged": unchanged,
+                "chunks_deleted": deleted,
                 "file_name": file_name,
-                "detected_type": detected_type
+                "detected_type": detected_type,
+                "embedding_cache_hits": write_result["embedding_cache_hits"],
+                "embedding_cache_misses": write_result["embedding_cache_misses"],
+                "timings": timings
             }
             
         except Exception as e:
@@ -232,12 +407,15 @@ class IngestionManager:
                 "source_id": source_id,
                 "status": "failed",
                 "error": str(e),
-                "chunks": 0
+                "chunks": 0,
+                "timings": timings
             }
     
-    async def ingest_pending_sources(self, limit: int = 50, max_concurrency: int = 5) -> Dict:
-        """Process unprocessed sources with concurrency control"""
-        sources = fetch_unprocessed_sources(limit=limit)
+    async def ingest_pending_sources(
+        self, limit: int = 50, max_concurrency: int = 5, on_progress: Optional[ProgressCallback] = None
+    ) -> Dict:
+        """Claim up to `limit` unprocessed sources and process them with concurrency control"""
+        sources = await self._claim(limit)
         
         if not sources:
             return {
@@ -248,17 +426,7 @@ class IngestionManager:
                 "results": []
             }
         
-        # Process sources with concurrency limit
-        semaphore = asyncio.Semaphore(max_concurrency)
-        
-        async def process_with_semaphore(source):
-            async with semaphore:
-                return await self.process_single_source(source)
-        
-        results = await asyncio.gather(
-            *[process_with_semaphore(source) for source in sources],
-            return_exceptions=True
-        )
+        results = await self._process_with_limit(sources, max_concurrency, on_progress)
         
         # Aggregate results
         processed = sum(1 for r in results if isinstance(r, dict) and r.get("status") == "success")
@@ -270,35 +438,43 @@ class IngestionManager:
             "processed": processed,
             "failed": failed, 
             "skipped": skipped,
+            "embedding_cache_hit_rate": self._embedding_hit_rate(results),
             "results": results
         }
     
-    async def ingest_study_kit_sources(self, studyKitId: str, max_concurrency: int = 5) -> Dict:
-        """Process all sources for a specific study kit"""
-        sources = get_sources_by_study_kit(studyKitId)
-        unprocessed_sources = [s for s in sources if not s.get("processed", False)]
+    async def ingest_study_kit_sources(
+        self,
+        studyKitId: str,
+        max_concurrency: int = 5,
+        reingest: bool = False,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict:
+        """
+        Process all unprocessed sources for a specific study kit.
+        With reingest=True, already processed sources are run again; only their
+        changed chunks are embedded and removed chunks are deleted.
+        """
+        # Counted server-side; the rows themselves come back from the claim
+        total, processed_count = await asyncio.gather(
+            asyncio.to_thread(count_sources, studyKitId),
+            asyncio.to_thread(count_sources, studyKitId, True),
+        )
+        candidates = total if reingest else total - processed_count
+        # Only rows not leased by another worker are processed here
+        claimed = await self._claim(candidates, studyKitId=studyKitId, include_processed=reingest)
         
-        if not unprocessed_sources:
+        if not claimed:
             return {
                 "studyKitId": studyKitId,
-                "total_sources": len(sources),
-                "already_processed": len(sources),
+                "total_sources": total,
+                "already_processed": total - candidates,
+                "leased_elsewhere": candidates,
                 "newly_processed": 0,
                 "failed": 0,
                 "skipped": 0
             }
         
-        # Process with concurrency
-        semaphore = asyncio.Semaphore(max_concurrency)
-        
-        async def process_with_semaphore(source):
-            async with semaphore:
-                return await self.process_single_source(source)
-        
-        results = await asyncio.gather(
-            *[process_with_semaphore(source) for source in unprocessed_sources],
-            return_exceptions=True
-        )
+        results = await self._process_with_limit(claimed, max_concurrency, on_progress)
         
         # Aggregate results
         processed = sum(1 for r in results if isinstance(r, dict) and r.get("status") == "success")
@@ -307,18 +483,15 @@ class IngestionManager:
         
         return {
             "studyKitId": studyKitId,
-            "total_sources": len(sources),
-            "already_processed": len(sources) - len(unprocessed_sources),
+            "total_sources": total,
+            "already_processed": total - candidates,
+            "leased_elsewhere": max(0, candidates - len(claimed)),
             "newly_processed": processed,
             "failed": failed,
             "skipped": skipped,
+            "embedding_cache_hit_rate": self._embedding_hit_rate(results),
             "results": results
         }
 
 # Global instance
 ingestion_manager = IngestionManager()
-
-
-
-
-
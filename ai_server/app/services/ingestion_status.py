@@ -0,0 +1,85 @@
+# app/services/ingestion_status.py
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from app.db.supabase_client import count_sources, fetch_source_counts_by_kit
+from app.services.cache import TTLCache
+from app.services.job_queue import job_queue, QUEUED, RUNNING
+
+logger = logging.getLogger(__name__)
+
+# Dashboards poll /ingest/status; within this window they share one set of count queries
+INGEST_STATUS_TTL = float(os.getenv("INGEST_STATUS_TTL", "5"))
+# Ingestion rate is measured over this trailing window
+INGEST_RATE_WINDOW = int(os.getenv("INGEST_RATE_WINDOW_SECONDS", "300"))
+
+_status_cache = TTLCache(maxsize=256, ttl=INGEST_STATUS_TTL)
+# Refreshes in flight, by cache key; an entry is removed as soon as its refresh finishes
+_refreshes: Dict[str, asyncio.Future] = {}
+
+
+async def _compute_status(studyKitId: Optional[str], by_kit: bool) -> Dict:
+    since = datetime.now(timezone.utc) - timedelta(seconds=INGEST_RATE_WINDOW)
+    # Independent head-count requests, sent concurrently
+    total, processed, in_progress, recent, jobs = await asyncio.gather(
+        asyncio.to_thread(count_sources, studyKitId),
+        asyncio.to_thread(count_sources, studyKitId, True),
+        asyncio.to_thread(count_sources, studyKitId, False, True),
+        asyncio.to_thread(count_sources, studyKitId, None, False, since),
+        asyncio.to_thread(job_queue.counts),
+    )
+    unprocessed = total - processed
+    status = {
+        "unprocessed_count": unprocessed,
+        "processed_count": processed,
+        "total_sources": total,
+        "in_progress": in_progress,
+        "queue_depth": {
+            # Unprocessed rows nobody holds a lease on
+            "sources_waiting": max(0, unprocessed - in_progress),
+            "jobs_queued": jobs.get(QUEUED, 0),
+            "jobs_running": jobs.get(RUNNING, 0),
+        },
+        "ingestion_rate": {
+            "window_seconds": INGEST_RATE_WINDOW,
+            "sources_processed": recent,
+            "per_minute": round(recent * 60 / INGEST_RATE_WINDOW, 2),
+        },
+    }
+    if studyKitId:
+        status["studyKitId"] = studyKitId
+    if by_kit:
+        rows = await asyncio.to_thread(fetch_source_counts_by_kit, studyKitId)
+        status["by_kit"] = [
+            {**row, "unprocessed": row["total"] - row["processed"]}
+            for row in sorted(rows, key=lambda r: r["total"] - r["processed"], reverse=True)
+        ]
+    status["generated_at"] = time.time()
+    return status
+
+
+async def get_ingestion_status(studyKitId: Optional[str] = None, by_kit: bool = False) -> Dict:
+    """
+    Source counts, queue depth and ingestion rate from server-side count queries,
+    cached for INGEST_STATUS_TTL seconds. Concurrent pollers wait for one refresh.
+    """
+    key = f"{studyKitId or '*'}:{int(by_kit)}"
+    status = _status_cache.get(key)
+    if status is not None:
+        return status
+    refresh = _refreshes.get(key)
+    if refresh is None:
+        refresh = asyncio.ensure_future(_compute_status(studyKitId, by_kit))
+        _refreshes[key] = refresh
+
+        def _done(fut: asyncio.Future):
+            _refreshes.pop(key, None)
+            if not fut.cancelled() and fut.exception() is None:
+                _status_cache.set(key, fut.result())
+
+        refresh.add_done_callback(_done)
+    # A poller that disconnects must not cancel the refresh the others are waiting on
+    return await asyncio.shield(refresh)
@@ -0,0 +1,234 @@
+# app/services/job_queue.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", "./.ingest_queue/jobs.db")
+INGEST_JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", "3"))
+# Retry delay is backoff_base * 2^(attempt - 1), capped at backoff_max
+INGEST_JOB_BACKOFF_BASE = float(os.getenv("INGEST_JOB_BACKOFF_BASE", "10"))
+INGEST_JOB_BACKOFF_MAX = float(os.getenv("INGEST_JOB_BACKOFF_MAX", "600"))
+# A running job whose worker hasn't heartbeated for this long is considered abandoned
+INGEST_JOB_LEASE_SECONDS = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "120"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+# heartbeat() results besides None (keep going)
+HEARTBEAT_CANCEL, HEARTBEAT_LOST = "cancel", "lost"
+
+
+class JobQueue:
+    """
+    Persistent job queue in a SQLite file, shared by the API process (enqueue,
+    status, cancel) and any number of worker processes (claim, heartbeat, finish).
+    Claims run inside BEGIN IMMEDIATE so two workers never take the same job.
+    """
+
+    def __init__(
+        self,
+        path: str = INGEST_QUEUE_PATH,
+        lease_seconds: float = INGEST_JOB_LEASE_SECONDS,
+        backoff_base: float = INGEST_JOB_BACKOFF_BASE,
+        backoff_max: float = INGEST_JOB_BACKOFF_MAX
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit mode; multi-statement updates use explicit transactions
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+                " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+                " run_after REAL NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+                " worker TEXT, heartbeat_at REAL, cancel_requested INTEGER NOT NULL DEFAULT 0,"
+                " progress TEXT, result TEXT, error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+        return self._conn
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("payload", "progress", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+
+    # --- API side ---
+    def enqueue(self, kind: str, payload: Dict[str, Any], max_attempts: int = INGEST_JOB_MAX_ATTEMPTS) -> Dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, max(1, max_attempts), now, now)
+            )
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._to_dict(self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            conn = self._connect()
+            if status:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            return [self._to_dict(r) for r in rows]
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Queued jobs are cancelled at once; running ones are flagged and stopped by their worker"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, cancel_requested = 1 WHERE id = ? AND status = ?",
+                (CANCELLED, now, job_id, QUEUED)
+            )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    # --- worker side ---
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Take the oldest runnable job, first requeueing jobs whose worker stopped heartbeating"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                abandoned = conn.execute(
+                    "SELECT id, attempts, max_attempts, worker FROM jobs WHERE status = ? AND heartbeat_at < ?",
+                    (RUNNING, now - self.lease_seconds)
+                ).fetchall()
+                for row in abandoned:
+                    logger.warning(f"Job {row['id']} lost its worker {row['worker']}; requeueing")
+                    self._retry_or_fail(conn, row["id"], row["attempts"], row["max_attempts"], "worker lease expired", now)
+
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND run_after <= ? ORDER BY run_after, created_at LIMIT 1",
+                    (QUEUED, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, started_at = ?,"
+                    " heartbeat_at = ?, error = NULL WHERE id = ?",
+                    (RUNNING, worker, now, now, row["id"])
+                )
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return self._to_dict(job)
+
+    def heartbeat(self, job_id: str, worker: str, progress: Optional[Dict] = None) -> Optional[str]:
+        """
+        Renew the job's lease and store progress. Returns HEARTBEAT_CANCEL if
+        cancellation was requested, HEARTBEAT_LOST if the job is no longer this
+        worker's (its lease expired and it was requeued or finished), else None.
+        """
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, progress = COALESCE(?, progress)"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), json.dumps(progress) if progress is not None else None, job_id, worker, RUNNING)
+            )
+            if cur.rowcount == 0:
+                return HEARTBEAT_LOST
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return HEARTBEAT_CANCEL if row["cancel_requested"] else None
+
+    def _finish(self, job_id: str, worker: str, status: str, progress: Optional[Dict], result: Optional[Dict], error: Optional[str]):
+        with self._lock:
+            # Only the worker holding the job may finish it (its lease may have been taken over)
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, heartbeat_at = ?, progress = COALESCE(?, progress),"
+                " result = ?, error = ? WHERE id = ? AND worker = ? AND status = ?",
+                (status, time.time(), time.time(), json.dumps(progress) if progress is not None else None,
+                 json.dumps(result) if result is not None else None, error, job_id, worker, RUNNING)
+            )
+
+    def complete(self, job_id: str, worker: str, result: Dict, progress: Optional[Dict] = None):
+        self._finish(job_id, worker, SUCCEEDED, progress, result, None)
+
+    def mark_cancelled(self, job_id: str, worker: str, progress: Optional[Dict] = None):
+        self._finish(job_id, worker, CANCELLED, progress, None, "cancelled")
+
+    def fail(self, job_id: str, worker: str, error: str, progress: Optional[Dict] = None):
+        """Requeue with exponential backoff, or mark failed once attempts are used up"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                (job_id, worker, RUNNING)
+            ).fetchone()
+            if row is None:
+                return
+            if progress is not None:
+                conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+            self._retry_or_fail(conn, job_id, row["attempts"], row["max_attempts"], error, time.time())
+
+    def _retry_or_fail(self, conn: sqlite3.Connection, job_id: str, attempts: int, max_attempts: int, error: str, now: float):
+        # A job that was asked to stop is not retried
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ? AND cancel_requested = 1",
+            (CANCELLED, now, error, job_id)
+        )
+        if cur.rowcount:
+            return
+        if attempts < max_attempts:
+            conn.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, worker = NULL, heartbeat_at = NULL, error = ? WHERE id = ?",
+                (QUEUED, now + self._backoff(attempts), error, job_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?", (FAILED, now, error, job_id)
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Global instance
+job_queue = JobQueue()
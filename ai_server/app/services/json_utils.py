@@ -1,7 +1,7 @@
 # app/services/json_utils.py
 import json
 import re
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
 def _strip_code_blocks(text: str) -> str:
     # removes triple/backtick code fences and leading/trailing quotes
@@ -43,3 +43,122 @@ def extract_json_from_text(text: str) -> Any:
 
     # 3) Give up
     raise ValueError("No JSON found in model output. Raw text:\n" + text)
+
+
+_PARTIAL_UNICODE_ESCAPE = re.compile(r"\\u[0-9a-fA-F]{0,3}$")
+
+
+class StreamingJSONParser:
+    """
+    Incremental scanner for one JSON object streamed by an LLM (preamble and
+    code fences before the first "{" are skipped). feed() returns events:
+      ("item", obj)   - each element of the top-level array `items_key`, as soon as it closes
+      ("text", delta) - newly decoded characters of the top-level string field `text_key`
+    The stream is not validated here; parse the full text at the end with
+    extract_json_from_text and the response schema.
+    """
+
+    def __init__(self, items_key: Optional[str] = None, text_key: Optional[str] = None):
+        self.items_key = items_key
+        self.text_key = text_key
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._item_start: Optional[int] = None
+        self._text_start: Optional[int] = None
+        self._text_sent = 0
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def _text_delta(self, end: int) -> Optional[Tuple[str, Any]]:
+        raw = self._buf[self._text_start:end]
+        # Hold back an escape sequence that has not fully arrived yet
+        if raw.endswith("\\") and (len(raw) - len(raw.rstrip("\\"))) % 2:
+            raw = raw[:-1]
+        raw = _PARTIAL_UNICODE_ESCAPE.sub("", raw)
+        try:
+            decoded = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return None
+        delta = decoded[self._text_sent:]
+        if not delta:
+            return None
+        self._text_sent = len(decoded)
+        return ("text", delta)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        self._buf += chunk
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            if self.done:
+                break
+            c = buf[i]
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._stack.append(c)
+                    self._expect_key = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        if self._expect_key:
+                            self._key = json.loads(buf[self._string_start:i + 1])
+                        elif self._text_start is not None:
+                            event = self._text_delta(i)
+                            if event:
+                                events.append(event)
+                            self._text_start = None
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if len(self._stack) == 1 and not self._expect_key and self._key == self.text_key and self.text_key:
+                    self._text_start = i + 1
+                    self._text_sent = 0
+            elif c in "{[":
+                self._stack.append(c)
+                if (c == "{" and len(self._stack) == 3 and self._stack[1] == "["
+                        and self.items_key and self._key == self.items_key):
+                    self._item_start = i
+            elif c in "}]":
+                if c == "}" and len(self._stack) == 3 and self._item_start is not None:
+                    try:
+                        events.append(("item", json.loads(buf[self._item_start:i + 1])))
+                    except json.JSONDecodeError:
+                        pass  # left for the final parse to report
+                    self._item_start = None
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            elif len(self._stack) == 1:
+                if c == ":":
+                    self._expect_key = False
+                elif c == ",":
+                    self._expect_key = True
+        self._pos = len(buf)
+
+        # Partial string value: send what has been decoded so far
+        if self._in_string and self._text_start is not None:
+            event = self._text_delta(len(buf))
+            if event:
+                events.append(event)
+        return events
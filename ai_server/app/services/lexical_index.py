@@ -0,0 +1,475 @@
+# app/services/lexical_index.py
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import threading
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "./.lexical_index")
+# Collection used when none is given (vectorstore imports it from here)
+DEFAULT_COLLECTION = os.getenv("VECTOR_COLLECTION", "study_resources")
+# Segments are merged into one (dropping deleted chunks) once there are more than this many
+LEXICAL_MAX_SEGMENTS = int(os.getenv("LEXICAL_MAX_SEGMENTS", "8"))
+# How often searches look for segments and deletes written by another process
+LEXICAL_RELOAD_INTERVAL = float(os.getenv("LEXICAL_RELOAD_INTERVAL", "2"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Keeps "4.2.1", "h2o", "navier-stokes" and "log_2" as single terms
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-_][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in into is it its of on or such that the their then "
+    "there these they this to was were will with".split()
+)
+# Metadata fields searches can filter on -> doc table columns (same fields as the vector stores)
+FILTER_COLUMNS = {"studyKitId": "study_kit_id", "source_id": "source_id", "file_type": "file_type"}
+
+POSTING = np.dtype([("doc", "<u4"), ("tf", "<u2")])
+_SQL_BATCH = 500
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        # "navier-stokes" is also findable as "stokes"
+        if not token.isalnum():
+            tokens.extend(p for p in re.split(r"[.\-_]", token) if len(p) > 1 and p.isalpha() and p not in _STOPWORDS)
+    return tokens
+
+
+def _fsync(path: str):
+    with open(path, "rb") as fh:
+        os.fsync(fh.fileno())
+
+
+class _Segment:
+    """
+    Immutable postings for a batch of chunks:
+      seg-<n>.postings.npy - (doc uint32, tf uint16) records grouped by term, memory-mapped
+      seg-<n>.terms.json   - term -> [start, end) into the postings array
+    """
+
+    def __init__(self, directory: str, seg_id: int):
+        self.seg_id = seg_id
+        base = os.path.join(directory, f"seg-{seg_id:06d}")
+        with open(base + ".terms.json", "r", encoding="utf-8") as fh:
+            self.terms: Dict[str, List[int]] = json.load(fh)
+        self.postings = np.load(base + ".postings.npy", mmap_mode="r")
+
+    def get(self, term: str) -> Optional[np.ndarray]:
+        span = self.terms.get(term)
+        return self.postings[span[0]:span[1]] if span else None
+
+    @staticmethod
+    def write(directory: str, seg_id: int, postings: Dict[str, np.ndarray]) -> "_Segment":
+        base = os.path.join(directory, f"seg-{seg_id:06d}")
+        terms, arrays, offset = {}, [], 0
+        for term in sorted(postings):
+            arr = postings[term]
+            terms[term] = [offset, offset + len(arr)]
+            offset += len(arr)
+            arrays.append(arr)
+        np.save(base + ".postings.npy", np.concatenate(arrays).astype(POSTING, copy=False))
+        with open(base + ".terms.json", "w", encoding="utf-8") as fh:
+            json.dump(terms, fh, separators=(",", ":"))
+        _fsync(base + ".postings.npy")
+        _fsync(base + ".terms.json")
+        return _Segment(directory, seg_id)
+
+    def remove_files(self, directory: str):
+        base = os.path.join(directory, f"seg-{self.seg_id:06d}")
+        for suffix in (".postings.npy", ".terms.json"):
+            try:
+                os.remove(base + suffix)
+            except OSError:
+                pass
+
+
+class _DocTable:
+    """
+    doc id -> chunk id, token count and the filterable metadata fields, plus
+    tombstones (doc ids of replaced or deleted chunks, in order) so that other
+    processes can catch up without rereading every row.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " doc INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL UNIQUE, length INTEGER NOT NULL,"
+            f" {', '.join(c + ' TEXT' for c in FILTER_COLUMNS.values())})"
+        )
+        for column in FILTER_COLUMNS.values():
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS docs_{column} ON docs ({column})")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tombstones (seq INTEGER PRIMARY KEY AUTOINCREMENT, doc INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _select_in(self, sql: str, values: List[Any]) -> List[tuple]:
+        rows = []
+        for i in range(0, len(values), _SQL_BATCH):
+            batch = values[i:i + _SQL_BATCH]
+            rows.extend(self._conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+        return rows
+
+    def docs_for(self, chunk_ids: List[str]) -> List[int]:
+        with self._lock:
+            return [r[0] for r in self._select_in("SELECT doc FROM docs WHERE chunk_id IN ({})", chunk_ids)]
+
+    def chunk_ids(self, docs: List[int]) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._select_in("SELECT doc, chunk_id FROM docs WHERE doc IN ({})", docs))
+
+    def replace(self, chunk_ids: List[str], rows: List[tuple], below: int):
+        """
+        Drop rows for chunk_ids and insert rows, in one transaction. Dropped docs
+        under below (the first doc id of this write) get a tombstone; higher ones
+        are leftovers of a write that crashed before its manifest and never served.
+        """
+        with self._lock:
+            for i in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = chunk_ids[i:i + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                self._conn.execute(
+                    f"INSERT INTO tombstones (doc) SELECT doc FROM docs WHERE chunk_id IN ({marks}) AND doc < ?",
+                    [*batch, below]
+                )
+                self._conn.execute(f"DELETE FROM docs WHERE chunk_id IN ({marks})", batch)
+            if rows:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO docs VALUES ({', '.join('?' * (3 + len(FILTER_COLUMNS)))})", rows
+                )
+            self._conn.commit()
+
+    def changes(self, from_doc: int, after_seq: int) -> Tuple[Optional[List[tuple]], List[int], int]:
+        """
+        (doc, length) rows with doc >= from_doc, docs tombstoned after after_seq,
+        and the last tombstone seq. Rows is None if tombstones after after_seq
+        were already pruned, in which case the caller reloads every length.
+        """
+        with self._lock:
+            first, last = self._conn.execute("SELECT MIN(seq), MAX(seq) FROM tombstones").fetchone()
+            last = last if last is not None else after_seq
+            if first is not None and after_seq < first - 1:
+                return None, [], last
+            rows = self._conn.execute("SELECT doc, length FROM docs WHERE doc >= ?", (from_doc,)).fetchall()
+            dead = [r[0] for r in self._conn.execute("SELECT doc FROM tombstones WHERE seq > ?", (after_seq,))]
+        return rows, dead, last
+
+    def last_tombstone(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM tombstones").fetchone()[0]
+
+    def prune_tombstones(self):
+        """Called after a merge; the newest is kept so changes() can tell what was pruned"""
+        with self._lock:
+            self._conn.execute("DELETE FROM tombstones WHERE seq < (SELECT MAX(seq) FROM tombstones)")
+            self._conn.commit()
+
+    def lengths(self, size: int) -> np.ndarray:
+        out = np.zeros(size, dtype=np.float32)
+        with self._lock:
+            for doc, length in self._conn.execute("SELECT doc, length FROM docs"):
+                if doc < size:
+                    out[doc] = length
+        return out
+
+    def docs_matching(self, filter: Dict[str, Any]) -> np.ndarray:
+        clauses, params = [], []
+        for field, value in filter.items():
+            if field not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter on {field!r}; supported fields: {', '.join(FILTER_COLUMNS)}")
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{FILTER_COLUMNS[field]} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT doc FROM docs WHERE {' AND '.join(clauses)}", params).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _CollectionIndex:
+    """
+    BM25 index for one collection, log-structured: every write adds a small
+    segment, and segments are merged once there are too many. MANIFEST lists
+    the live segments and is replaced atomically; searches use the segment list
+    and length array they started with and never wait on a write. Writers in
+    different processes take turns on LOCK and catch up with each other's
+    writes (a new MANIFEST generation) before writing; searches check for a
+    new generation every LEXICAL_RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_path = os.path.join(directory, "MANIFEST")
+        self._lock_path = os.path.join(directory, "LOCK")
+        self._table = _DocTable(os.path.join(directory, "docs.sqlite3"))
+        self._write_lock = threading.Lock()
+        self._generation = -1
+        self._tombstone_seq = 0
+        self._next_doc = 0
+        self._next_segment = 0
+        self._segments: List[_Segment] = []
+        # Token count per doc id; 0 marks a deleted or replaced chunk
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._checked_at = 0.0
+        with self._write_lock:
+            self._refresh()
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {"segments": [], "next_doc": 0, "next_segment": 0}
+
+    def _write_manifest(self, segments: List[_Segment], next_doc: int, next_segment: int):
+        tmp = self._manifest_path + ".tmp"
+        generation = self._generation + 1
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({
+                "segments": [s.seg_id for s in segments], "next_doc": next_doc,
+                "next_segment": next_segment, "generation": generation,
+            }, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._manifest_path)
+        self._generation = generation
+
+    def _refresh(self):
+        """Pick up segments, docs and deletes committed by other processes (write lock held)"""
+        manifest = self._read_manifest()
+        generation = manifest.get("generation", 0)
+        if generation == self._generation:
+            return
+        known = {s.seg_id: s for s in self._segments}
+        try:
+            segments = [known.get(seg_id) or _Segment(self.directory, seg_id) for seg_id in manifest["segments"]]
+        except OSError:
+            # Merged away after the manifest was read; the next refresh sees the newer one
+            return
+        next_doc = manifest["next_doc"]
+        rows, dead, seq = self._table.changes(self._next_doc, self._tombstone_seq)
+        if rows is None:
+            lengths = self._table.lengths(next_doc)
+        else:
+            lengths = np.zeros(next_doc, dtype=np.float32)
+            kept = min(len(self._lengths), next_doc)
+            lengths[:kept] = self._lengths[:kept]
+            for doc, length in rows:
+                # Rows past next_doc belong to a write whose manifest isn't out yet
+                if doc < next_doc:
+                    lengths[doc] = length
+            dead = [d for d in dead if d < next_doc]
+            lengths[dead] = 0
+        # Lengths before segments, so a search never sees postings for docs it has no length for
+        self._lengths = lengths
+        self._segments = segments
+        self._next_doc, self._next_segment = next_doc, manifest["next_segment"]
+        self._generation, self._tombstone_seq = generation, seq
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._checked_at < LEXICAL_RELOAD_INTERVAL:
+            return
+        # A write running in this process catches up on its own
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            self._refresh()
+        finally:
+            self._write_lock.release()
+
+    def add(self, chunk_ids: List[str], texts: List[str], metadatas: List[dict]):
+        with self._write_lock, file_lock(self._lock_path):
+            self._refresh()
+            start = self._next_doc
+            replaced = [d for d in self._table.docs_for(chunk_ids) if d < start]
+            postings: Dict[str, list] = defaultdict(list)
+            rows, lengths = [], []
+            for offset, (chunk_id, text, meta) in enumerate(zip(chunk_ids, texts, metadatas)):
+                doc = start + offset
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    postings[term].append((doc, min(tf, 65535)))
+                length = sum(counts.values())
+                lengths.append(length)
+                rows.append((doc, chunk_id, length, *[(meta or {}).get(f) for f in FILTER_COLUMNS]))
+
+            segments = list(self._segments)
+            if postings:
+                arrays = {term: np.array(p, dtype=POSTING) for term, p in postings.items()}
+                segments.append(_Segment.write(self.directory, self._next_segment, arrays))
+            next_doc = start + len(rows)
+            next_segment = self._next_segment + (1 if postings else 0)
+
+            # Segment files, then doc rows, then manifest: other processes catch up from the
+            # manifest, so all it names is committed; a crash in between leaves only unreachable data
+            self._table.replace(chunk_ids, rows, below=start)
+            self._write_manifest(segments, next_doc, next_segment)
+            self._tombstone_seq = self._table.last_tombstone()
+
+            new_lengths = np.zeros(next_doc, dtype=np.float32)
+            new_lengths[:len(self._lengths)] = self._lengths
+            new_lengths[replaced] = 0
+            new_lengths[start:next_doc] = lengths
+            # Lengths before segments, so a search never sees postings for docs it has no length for
+            self._lengths = new_lengths
+            self._segments = segments
+            self._next_doc, self._next_segment = next_doc, next_segment
+            if len(segments) > LEXICAL_MAX_SEGMENTS:
+                self._merge()
+
+    def delete(self, chunk_ids: List[str]) -> int:
+        with self._write_lock, file_lock(self._lock_path):
+            self._refresh()
+            docs = self._table.docs_for(chunk_ids)
+            if not docs:
+                return 0
+            self._table.replace(chunk_ids, [], below=self._next_doc)
+            # Same segments, new generation: tells other processes to apply the tombstones
+            self._write_manifest(self._segments, self._next_doc, self._next_segment)
+            self._tombstone_seq = self._table.last_tombstone()
+            lengths = self._lengths.copy()
+            lengths[[d for d in docs if d < len(lengths)]] = 0
+            self._lengths = lengths
+            return len(docs)
+
+    def _merge(self):
+        """Rewrite all segments as one, dropping postings of deleted chunks (write locks held)"""
+        old = self._segments
+        alive = self._lengths > 0
+        merged: Dict[str, np.ndarray] = {}
+        for term in set().union(*(s.terms for s in old)):
+            parts = [p for p in (s.get(term) for s in old) if p is not None]
+            post = np.concatenate(parts)
+            post = post[alive[post["doc"]]]
+            if len(post):
+                merged[term] = post
+        segments = [_Segment.write(self.directory, self._next_segment, merged)] if merged else []
+        self._next_segment += 1
+        self._write_manifest(segments, self._next_doc, self._next_segment)
+        self._segments = segments
+        self._table.prune_tombstones()
+        # Searches still holding an old segment keep its mapping after the unlink
+        for s in old:
+            s.remove_files(self.directory)
+        logger.info(f"Lexical index {self.directory}: merged {len(old)} segments")
+
+    def search(self, query: str, k: int, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        self._maybe_reload()
+        terms = set(tokenize(query))
+        segments, lengths = self._segments, self._lengths
+        alive = lengths > 0
+        n_docs = int(alive.sum())
+        if not terms or n_docs == 0 or k <= 0:
+            return []
+        avgdl = float(lengths[alive].mean())
+        allowed = alive
+        if filter:
+            matching = self._table.docs_matching(filter)
+            allowed = np.zeros_like(alive)
+            allowed[matching[matching < len(alive)]] = True
+            allowed &= alive
+
+        doc_parts, score_parts = [], []
+        for term in terms:
+            parts = [p for p in (s.get(term) for s in segments) if p is not None]
+            if not parts:
+                continue
+            post = np.concatenate(parts)
+            docs = post["doc"].astype(np.int64)
+            docs_known = docs < len(lengths)
+            live = np.zeros(len(docs), dtype=bool)
+            live[docs_known] = alive[docs[docs_known]]
+            df = int(live.sum())
+            if df == 0:
+                continue
+            keep = np.zeros(len(docs), dtype=bool)
+            keep[docs_known] = allowed[docs[docs_known]]
+            docs, tf = docs[keep], post["tf"][keep].astype(np.float32)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[docs] / avgdl)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if not doc_parts:
+            return []
+
+        unique, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(score_parts))
+        top = np.argsort(-totals)[:k]
+        chunk_ids = self._table.chunk_ids(unique[top].tolist())
+        return [(chunk_ids[int(unique[i])], float(totals[i])) for i in top if int(unique[i]) in chunk_ids]
+
+    def get_metrics(self) -> Dict:
+        return {"segments": len(self._segments), "docs": int((self._lengths > 0).sum())}
+
+    def close(self):
+        with self._write_lock:
+            self._table.close()
+
+
+class LexicalIndex:
+    """
+    On-disk BM25 indexes, one per vector collection, kept in step with the
+    vector store by store_embedded_documents / delete_chunks.
+    """
+
+    def __init__(self, index_dir: str = LEXICAL_INDEX_DIR):
+        self.index_dir = index_dir
+        self._indexes: Dict[str, _CollectionIndex] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, collection_name: Optional[str]) -> _CollectionIndex:
+        collection_name = collection_name or DEFAULT_COLLECTION
+        index = self._indexes.get(collection_name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(collection_name)
+                if index is None:
+                    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", collection_name)
+                    index = _CollectionIndex(os.path.join(self.index_dir, slug))
+                    self._indexes[collection_name] = index
+        return index
+
+    def add(self, collection_name: str, chunk_ids: List[str], texts: List[str], metadatas: List[dict]):
+        if chunk_ids:
+            self._index(collection_name).add(list(chunk_ids), list(texts), list(metadatas))
+
+    def delete(self, collection_name: str, chunk_ids: List[str]) -> int:
+        return self._index(collection_name).delete(list(chunk_ids)) if chunk_ids else 0
+
+    def search(self, collection_name: str, query: str, k: int = 10, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, bm25_score) for query, optionally restricted by metadata filter"""
+        return self._index(collection_name).search(query, k, filter)
+
+    def get_metrics(self) -> Dict:
+        return {name: index.get_metrics() for name, index in self._indexes.items()}
+
+    def close(self):
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+
+# Global instance
+lexical_index = LexicalIndex()
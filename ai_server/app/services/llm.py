@@ -1,9 +1,13 @@
 import asyncio
-from typing import Optional
+import logging
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
 from langchain_openai import ChatOpenAI 
 from langchain_groq import ChatGroq 
 from langchain.schema import HumanMessage, SystemMessage
 from langchain_core.output_parsers import StrOutputParser
+from app.services.llm_cache import llm_cache
 
 
 from dotenv import load_dotenv
@@ -11,40 +15,188 @@ import openai
 import os
 load_dotenv()
 
+# Process-wide cap on in-flight LLM calls across all requests (provider rate limits)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+_llm_slots = asyncio.Semaphore(LLM_MAX_IN_FLIGHT)
 
-class LLMProvider:
-    def __init__(self, provider: str = "openai", model:str = "gpt-4o", temperature: float = 0.0):
-        self.parser = StrOutputParser()
+logger = logging.getLogger(__name__)
+
+# Connection pool shared by every chat model client
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "50"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+# Models built at startup, as provider:model:temperature entries
+LLM_WARM_SPECS = os.getenv(
+    "LLM_WARM_SPECS",
+    "openai:gpt-4o:0.0,openai:gpt-4o:0.25,openai:gpt-4o:0.3,openai:gpt-4o:0.4"
+)
+
+
+class LLMRegistry:
+    """
+    Process-wide registry of long-lived chat model clients keyed by
+    (provider, model, temperature). All clients share one tuned HTTP pool.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, float], object] = {}
+        self._lock = threading.Lock()
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._sync_http: Optional[httpx.Client] = None
+
+    def _http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        if self._async_http is None:
+            limits = httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            )
+            self._async_http = httpx.AsyncClient(limits=limits, timeout=LLM_HTTP_TIMEOUT)
+            self._sync_http = httpx.Client(limits=limits, timeout=LLM_HTTP_TIMEOUT)
+        return self._sync_http, self._async_http
+
+    def _build(self, provider: str, model: str, temperature: float):
+        sync_http, async_http = self._http_clients()
         if provider == "openai":
             openai.api_key = os.getenv("OPENAI_API_KEY")
-            self.llm = ChatOpenAI(
+            return ChatOpenAI(
                 model=model,
                 temperature=temperature,
-                streaming=False)
+                streaming=False,
+                http_client=sync_http,
+                http_async_client=async_http)
         elif provider == "groq":
-            self.llm = ChatGroq(
+            return ChatGroq(
                 model=model,
                 temperature=temperature,
                 streaming=False,
-                groq_api_key=os.getenv("GROQ_API_KEY"))
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                http_client=sync_http,
+                http_async_client=async_http)
         else:
             raise ValueError(f"Unsupported provider: {provider}")
+
+    def get(self, provider: str, model: str, temperature: float):
+        key = (provider, model, float(temperature))
+        llm = self._models.get(key)
+        if llm is None:
+            with self._lock:
+                llm = self._models.get(key)
+                if llm is None:
+                    llm = self._build(provider, model, temperature)
+                    self._models[key] = llm
+        return llm
+
+    def warm(self, specs: str = LLM_WARM_SPECS) -> List[str]:
+        """Build the clients listed in specs; failures (e.g. missing API keys) are logged, not raised"""
+        warmed = []
+        for spec in [s.strip() for s in specs.split(",") if s.strip()]:
+            try:
+                provider, model, temperature = spec.rsplit(":", 2)
+                self.get(provider, model, float(temperature))
+                warmed.append(spec)
+            except Exception as e:
+                logger.warning(f"Could not warm LLM client '{spec}': {e}")
+        return warmed
+
+    async def aclose(self):
+        with self._lock:
+            self._models.clear()
+        if self._async_http is not None:
+            await self._async_http.aclose()
+            self._sync_http.close()
+            self._async_http = None
+            self._sync_http = None
+
+# Global instance
+llm_registry = LLMRegistry()
+
+class LLMProvider:
+    def __init__(self, provider: str = "openai", model:str = "gpt-4o", temperature: float = 0.0):
+        self.parser = StrOutputParser()
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+        # Cheap: clients are built once per (provider, model, temperature) and reused
+        self.llm = llm_registry.get(provider, model, temperature)
     
-    async def generate(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+    def cache_key(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+        return llm_cache.make_key(self.provider, self.model, self.temperature, system_prompt, user_prompt, max_tokens)
+
+    async def forget(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None):
+        """Drop a cached response, e.g. when it failed schema validation"""
+        await llm_cache.delete(self.cache_key(system_prompt, user_prompt, max_tokens))
+
+    async def generate(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int] = None,
+        cache_endpoint: Optional[str] = None
+    ) -> str:
         """
         Send prompts to the chat model and return plain text using StrOutputParser.
+        Pass cache_endpoint (e.g. "rag") to serve repeated identical calls from the
+        response cache, if that endpoint is enabled in LLM_CACHE_ENDPOINTS.
         """
+        use_cache = llm_cache.enabled_for(cache_endpoint)
+        if use_cache:
+            key = self.cache_key(system_prompt, user_prompt, max_tokens)
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return cached
+
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
         ]
 
-        # If the model supports async prediction, use it
-        if hasattr(self.llm, "apredict_messages"):
-            result = await self.llm.apredict_messages(messages)
-        else:
-            # Run sync call safely in async context
-            result = await asyncio.to_thread(self.llm.predict_messages, messages)
+        async with _llm_slots:
+            # If the model supports async prediction, use it
+            if hasattr(self.llm, "apredict_messages"):
+                result = await self.llm.apredict_messages(messages)
+            else:
+                # Run sync call safely in async context
+                result = await asyncio.to_thread(self.llm.predict_messages, messages)
 
         # Directly parse the result into a string
-        return self.parser.invoke(result)
+        text = self.parser.invoke(result)
+        if use_cache and text:
+            await llm_cache.set(key, text)
+        return text
+
+    async def stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int] = None,
+        cache_endpoint: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Like generate(), but yields text deltas as the model produces them.
+        A cached response is yielded as a single delta; a completed stream is cached.
+        """
+        use_cache = llm_cache.enabled_for(cache_endpoint)
+        if use_cache:
+            key = self.cache_key(system_prompt, user_prompt, max_tokens)
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+
+        parts = []
+        # The slot is held for the whole stream, like a blocking call
+        async with _llm_slots:
+            async for chunk in self.llm.astream(messages):
+                delta = chunk.content if isinstance(chunk.content, str) else ""
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+        text = "".join(parts)
+        if use_cache and text:
+            await llm_cache.set(key, text)
@@ -0,0 +1,83 @@
+# app/services/llm_cache.py
+import os
+import json
+import asyncio
+import hashlib
+from typing import Dict, Optional
+from app.services.cache import TTLCache, SQLiteCache
+
+LLM_CACHE_MAXSIZE = int(os.getenv("LLM_CACHE_MAXSIZE", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(6 * 3600)))
+# Optional disk tier, e.g. ./.cache/llm.sqlite3
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB")
+# Endpoints allowed to use the cache; callers opt in by passing cache_endpoint
+LLM_CACHE_ENDPOINTS = {
+    e.strip() for e in os.getenv("LLM_CACHE_ENDPOINTS", "summarize,rag,topics").split(",") if e.strip()
+}
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for deterministic LLM calls: an in-memory LRU in front of an
+    optional SQLite file. Keys cover provider, model, temperature and the prompts.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = LLM_CACHE_MAXSIZE,
+        ttl: float = LLM_CACHE_TTL,
+        db_path: Optional[str] = LLM_CACHE_DB,
+        endpoints=LLM_CACHE_ENDPOINTS
+    ):
+        self.ttl = ttl
+        self.endpoints = set(endpoints)
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._disk = SQLiteCache(db_path, namespace="llm") if db_path else None
+        self.metrics = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def enabled_for(self, endpoint: Optional[str]) -> bool:
+        return bool(endpoint) and endpoint in self.endpoints
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+        payload = json.dumps([system_prompt, user_prompt, max_tokens], ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{provider}|{model}|{temperature}|{digest}"
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._memory.get(key)
+        if value is not None:
+            self.metrics["hits"] += 1
+            return value
+        if self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                self._memory.set(key, value)
+                self.metrics["disk_hits"] += 1
+                return value
+        self.metrics["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._memory.set(key, value, ttl=ttl)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.set, key, value, ttl)
+
+    async def delete(self, key: str):
+        self._memory.delete(key)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.delete, key)
+
+    def get_metrics(self) -> Dict:
+        lookups = self.metrics["hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": round((lookups - self.metrics["misses"]) / lookups, 3) if lookups else 0.0,
+            "entries": self._memory.get_metrics()["entries"],
+            "disk": self._disk is not None,
+            "endpoints": sorted(self.endpoints),
+        }
+
+# Global instance
+llm_cache = LLMResponseCache()
@@ -1,9 +1,55 @@
 import os
+import hashlib
 import httpx 
 import tempfile 
-from typing import Tuple 
-from pypdf import PdfReader
-import docx2txt
+from typing import Tuple, Optional
+from app.services.extraction import extraction_engine
+from app.services.http_client import http_client
+
+# Streaming download limits
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", str(300 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_SPOOL_DIR = os.getenv("DOWNLOAD_SPOOL_DIR") or None
+ALLOWED_CONTENT_TYPES = [
+    t.strip() for t in os.getenv(
+        "ALLOWED_CONTENT_TYPES",
+        "application/pdf,"
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document,"
+        "application/octet-stream,binary/octet-stream,text/"
+    ).split(",") if t.strip()
+]
+
+class DownloadedFile:
+    """
+    A remote file spooled to local disk. Use as a context manager (or call
+    cleanup()) so the spool file is removed once the loaders are done with it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        content_type: Optional[str] = None,
+        sha256: Optional[str] = None,
+        etag: Optional[str] = None
+    ):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.sha256 = sha256
+        self.etag = etag
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
 
 def download_bytes(url: str, timeout: int=60)->bytes:
     """
@@ -16,26 +62,66 @@ def download_bytes(url: str, timeout: int=60)->bytes:
             return response.content
     except httpx.RequestError as e:
         raise RuntimeError(f"Failed to download from {url}. Error: {e}")
-    
-def pdf_bytes_to_text(b: bytes)->str:
-    from io import BytesIO 
-    reader = PdfReader(BytesIO(b))
-    pages = []
-    for p in reader.pages:
-        pages.append(p.extract_text() or "")
-    return "\n".join(pages).strip()
 
-def docx_bytes_to_text(b: bytes) -> str:
-    # Save to temp file and use docx2txt
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(b)
-        tmp_path = tmp.name
-    text = docx2txt.process(tmp_path) or ""
+async def download_bytes_async(url: str, timeout: int = 60) -> bytes:
+    """
+    Async variant of download_bytes using the shared, pooled HTTP client.
+    """
     try:
-        os.remove(tmp_path)
-    except Exception:
-        pass
-    return text
+        response = await http_client.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+    except httpx.RequestError as e:
+        raise RuntimeError(f"Failed to download from {url}. Error: {e}")
+
+def _check_response_headers(url: str, response: httpx.Response, max_bytes: int):
+    content_type = (response.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type and not any(content_type.startswith(t) for t in ALLOWED_CONTENT_TYPES):
+        raise RuntimeError(f"Refusing to download {url}: unsupported content-type '{content_type}'")
+
+    content_length = response.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise RuntimeError(f"Refusing to download {url}: {content_length} bytes exceeds limit of {max_bytes}")
+    return content_type or None
+
+async def download_to_file(url: str, timeout: int = 60, max_bytes: int = MAX_DOWNLOAD_BYTES) -> DownloadedFile:
+    """
+    Stream the content at url into a spool file without holding the whole body in memory.
+    Content-type and declared size are checked before the body is read, and the
+    actual size is enforced while streaming.
+    """
+    suffix = os.path.splitext(url.split("?")[0])[1].lower()
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=DOWNLOAD_SPOOL_DIR)
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            async with http_client.stream("GET", url, timeout=timeout) as response:
+                response.raise_for_status()
+                content_type = _check_response_headers(url, response, max_bytes)
+                etag = response.headers.get("etag")
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise RuntimeError(f"Download of {url} exceeded limit of {max_bytes} bytes")
+                    digest.update(chunk)
+                    fh.write(chunk)
+        return DownloadedFile(path, size, content_type, sha256=digest.hexdigest(), etag=etag)
+    except BaseException as e:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        if isinstance(e, httpx.RequestError):
+            raise RuntimeError(f"Failed to download from {url}. Error: {e}")
+        raise
+
+def pdf_bytes_to_text(b: bytes) -> str:
+    # Large PDFs are split into page ranges and extracted across worker processes
+    return extraction_engine.pdf_to_text(b)
+
+def docx_bytes_to_text(b: bytes) -> str:
+    return extraction_engine.docx_to_text(b)
 
 def bytes_to_text(url: str, b: bytes) -> Tuple[str, str]:
     url = url.lower()
@@ -49,4 +135,21 @@ def bytes_to_text(url: str, b: bytes) -> Tuple[str, str]:
     except Exception:
         return "", "binary"
 
+def file_to_text(url: str, path: str) -> Tuple[str, str]:
+    """
+    Same as bytes_to_text but reads from a spooled file, so the raw document is
+    never copied into memory; the extraction workers open the path directly.
+    """
+    url = url.lower()
+    if url.endswith(".pdf"):
+        return extraction_engine.pdf_to_text(path), "pdf"
+    if url.endswith(".docx"):
+        return extraction_engine.docx_to_text(path), "docx"
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+            return fh.read(), "text"
+    except Exception:
+        return "", "binary"
+
+
 
@@ -0,0 +1,107 @@
+# app/services/reranker.py
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from app.services.embeddings import EMBED_LOCAL_FILES_ONLY
+
+logger = logging.getLogger(__name__)
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates fetched from the retriever for the re-ranker to choose k from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Hard limit per request, queueing included; past it the retriever order is kept
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", str(os.cpu_count() or 4)))
+# Passages are cut to this many characters before scoring (the model reads ~512 tokens anyway)
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", "2000"))
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, passage) pairs with a local cross-encoder on CPU and keeps the best k.
+    Scoring runs on one worker thread so concurrent requests don't oversubscribe
+    the CPU; callers wait at most budget_ms and otherwise keep the original order.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, enabled: bool = RERANK_ENABLED):
+        self.model_name = model_name
+        self.enabled = enabled
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self.metrics = {"reranked": 0, "fallbacks": 0, "errors": 0, "total_ms": 0.0}
+
+    def _get_model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import CrossEncoder
+
+                    torch.set_num_threads(RERANK_THREADS)
+                    self._model = CrossEncoder(
+                        self.model_name, device="cpu", local_files_only=EMBED_LOCAL_FILES_ONLY
+                    )
+                    logger.info(f"Loaded re-ranker {self.model_name}")
+        return self._model
+
+    def warm(self):
+        """Load the model ahead of the first request (loading never fits in the budget)"""
+        if self.enabled:
+            self._get_model()
+
+    def _score(self, query: str, passages: List[str], deadline: float) -> Optional[List[float]]:
+        model = self._get_model()
+        scores: List[float] = []
+        for start in range(0, len(passages), RERANK_BATCH_SIZE):
+            # The caller has already given up on this request; don't spend CPU on it
+            if time.monotonic() > deadline:
+                return None
+            batch = [(query, p[:RERANK_MAX_CHARS]) for p in passages[start:start + RERANK_BATCH_SIZE]]
+            scores.extend(float(s) for s in model.predict(batch, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False))
+        return scores
+
+    def rerank(self, query: str, documents: List[Document], k: int, budget_ms: float = RERANK_BUDGET_MS) -> List[Document]:
+        """Best k documents by cross-encoder score, or the first k if the budget runs out"""
+        if not self.enabled or len(documents) <= 1:
+            return documents[:k]
+        started = time.monotonic()
+        deadline = started + budget_ms / 1000.0
+        future = self._executor.submit(self._score, query, [d.page_content for d in documents], deadline)
+        try:
+            scores = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            scores = None
+        except Exception as e:
+            logger.warning(f"Re-ranking failed, keeping retriever order: {e}")
+            self.metrics["errors"] += 1
+            return documents[:k]
+
+        if scores is None:
+            self.metrics["fallbacks"] += 1
+            return documents[:k]
+        self.metrics["reranked"] += 1
+        self.metrics["total_ms"] += (time.monotonic() - started) * 1000
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        return [documents[i] for i in order[:k]]
+
+    def get_metrics(self) -> Dict:
+        done = self.metrics["reranked"]
+        return {
+            "enabled": self.enabled,
+            "model": self.model_name,
+            "reranked": done,
+            "fallbacks": self.metrics["fallbacks"],
+            "errors": self.metrics["errors"],
+            "avg_ms": round(self.metrics["total_ms"] / done, 1) if done else 0.0,
+            "budget_ms": RERANK_BUDGET_MS,
+        }
+
+# Global instance
+reranker = CrossEncoderReranker()
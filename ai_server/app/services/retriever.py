@@ -1,10 +1,88 @@
 # app/services/retriever.py
-from typing import List
-from app.services.vectorstore import get_retriever
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from app.services.vectorstore import similarity_search, make_filter, get_documents, DEFAULT_COLLECTION
+from app.services.lexical_index import lexical_index
+from app.services.reranker import reranker, RERANK_CANDIDATES
 
-def get_contexts_for_query(query: str, k: int = 4, collection_name: str = None) -> List[str]:
-    retriever = get_retriever(collection_name=collection_name, k=k)
-    docs = retriever.get_relevant_documents(query)
+logger = logging.getLogger(__name__)
+
+# "hybrid" fuses BM25 and vector results; "vector" is dense similarity only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Reciprocal-rank fusion constant; larger values flatten the weight of top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# The lexical search runs here while the calling thread does the vector search
+_lexical_pool = ThreadPoolExecutor(max_workers=int(os.getenv("HYBRID_LEXICAL_WORKERS", "4")), thread_name_prefix="lexical")
+
+
+def _doc_key(d: Document) -> str:
+    return (d.metadata or {}).get("chunk_id") or hashlib.sha256(d.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """Merge ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def hybrid_search(query: str, k: int = 4, collection_name: Optional[str] = None, filter: Optional[Dict] = None) -> List[Document]:
+    """BM25 and vector search in parallel, merged with reciprocal-rank fusion"""
+    collection_name = collection_name or DEFAULT_COLLECTION
+    depth = max(k, HYBRID_CANDIDATES)
+    lexical = _lexical_pool.submit(lexical_index.search, collection_name, query, depth, filter)
+    dense = similarity_search(query, k=depth, collection_name=collection_name, filter=filter)
+    try:
+        lexical_ids = [chunk_id for chunk_id, _ in lexical.result()]
+    except Exception as e:
+        logger.warning(f"Lexical search failed for {collection_name}, using vector results only: {e}")
+        lexical_ids = []
+
+    docs = {_doc_key(d): d for d in dense}
+    dense_keys = list(docs)
+    # Lexical hits are stored ids, but a legacy chunk without chunk_id metadata is keyed by
+    # its content hash on the dense side: look such hits up so both lists use the same key
+    unknown = [chunk_id for chunk_id in lexical_ids if chunk_id not in docs]
+    fetched = get_documents(unknown, collection_name=collection_name) if unknown else {}
+    lexical_keys = []
+    for chunk_id in lexical_ids:
+        if chunk_id in docs:
+            lexical_keys.append(chunk_id)
+        elif chunk_id in fetched:
+            key = _doc_key(fetched[chunk_id])
+            docs.setdefault(key, fetched[chunk_id])
+            lexical_keys.append(key)
+    fused = reciprocal_rank_fusion([dense_keys, lexical_keys])[:k]
+    return [docs[key] for key in fused]
+
+
+def get_contexts_for_query(
+    query: str,
+    k: int = 4,
+    collection_name: str = None,
+    studyKitId: Optional[str] = None,
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = None
+) -> List[str]:
+    # Uses the long-lived collection handle; no per-query client setup.
+    # studyKitId / source_id / file_type narrow the search inside the index.
+    filter = make_filter(studyKitId=studyKitId, source_id=source_id, file_type=file_type)
+    # With re-ranking on, over-fetch and let the cross-encoder pick the best k
+    fetch_k = max(k, RERANK_CANDIDATES) if reranker.enabled else k
+    if RETRIEVAL_MODE == "hybrid":
+        docs = hybrid_search(query, k=fetch_k, collection_name=collection_name, filter=filter)
+    else:
+        docs = similarity_search(query, k=fetch_k, collection_name=collection_name, filter=filter)
+    docs = reranker.rerank(query, docs, k)
     # return list of texts or include metadata for citations
     contexts = []
     for d in docs:
@@ -0,0 +1,179 @@
+# app/services/status_writer.py
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.db.supabase_client import mark_sources_processed
+
+logger = logging.getLogger(__name__)
+
+# A flush happens once this many sources are waiting or the oldest has waited max_wait
+STATUS_BATCH_MAX_ITEMS = int(os.getenv("STATUS_BATCH_MAX_ITEMS", "200"))
+STATUS_BATCH_MAX_WAIT = float(os.getenv("STATUS_BATCH_MAX_WAIT", "1.0"))
+# Failed flushes are retried with backoff up to this delay; marks are never dropped while running
+STATUS_RETRY_MAX_DELAY = float(os.getenv("STATUS_RETRY_MAX_DELAY", "30"))
+STATUS_CLOSE_RETRIES = int(os.getenv("STATUS_CLOSE_RETRIES", "3"))
+
+
+class StatusWriter:
+    """
+    Collects "source processed" marks and writes them as bulk updates, one
+    request per distinct (loaderUsed, lease owner) pair, instead of one round
+    trip per source.
+    mark_processed() doesn't wait for the write; it returns a future (also
+    available through wait_written()) that resolves once the mark is in the
+    database. close() flushes whatever is left. Marks are idempotent, so a flush
+    that may or may not have reached the database is simply retried.
+    """
+
+    def __init__(self, max_items: int = STATUS_BATCH_MAX_ITEMS, max_wait: float = STATUS_BATCH_MAX_WAIT):
+        self.max_items = max_items
+        self.max_wait = max_wait
+        # source id -> (loaderUsed, lease owner); a later mark for the same source replaces an earlier one
+        self._pending: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        # source id -> resolves True once its latest mark is written, False if dropped at shutdown
+        self._written: Dict[str, asyncio.Future] = {}
+        self._cond: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.metrics = {"marked": 0, "flushes": 0, "requests": 0, "errors": 0}
+
+    def _ensure_started(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def mark_processed(
+        self, source_id: str, loader_used: Optional[str] = None, owner: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        Queue a source to be marked processed (and its lease cleared) in the next
+        flush. With owner, the mark only applies while owner still holds the lease.
+        While the writer is shutting down the mark is written right away
+        instead, so a source finishing at that moment is not lost.
+        """
+        loop = asyncio.get_running_loop()
+        if self._closing:
+            await asyncio.to_thread(mark_sources_processed, [source_id], loader_used, owner)
+            self.metrics["requests"] += 1
+            self.metrics["marked"] += 1
+            written = loop.create_future()
+            written.set_result(True)
+            return written
+        self._ensure_started()
+        async with self._cond:
+            self._pending[source_id] = (loader_used, owner)
+            written = self._written.get(source_id)
+            if written is None:
+                written = self._written[source_id] = loop.create_future()
+            self._cond.notify_all()
+        return written
+
+    async def wait_written(self, source_id: str) -> bool:
+        """Wait until the source's queued mark is written; False if it was dropped at shutdown"""
+        written = self._written.get(source_id)
+        if written is None:
+            return True
+        return await asyncio.shield(written)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        delay = 0.0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._pending or self._closing)
+                if not self._pending and self._closing:
+                    return
+                # Linger so marks from concurrently finishing sources share a request
+                deadline = loop.time() + self.max_wait
+                while not self._closing and len(self._pending) < self.max_items:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+            if await self.flush():
+                delay = 0.0
+            elif self._closing:
+                return
+            else:
+                # Back off (close() cuts it short); the rows stay leased to this worker meanwhile
+                delay = min(STATUS_RETRY_MAX_DELAY, max(1.0, delay * 2))
+                async with self._cond:
+                    try:
+                        await asyncio.wait_for(self._cond.wait_for(lambda: self._closing), delay)
+                    except asyncio.TimeoutError:
+                        pass
+
+    async def flush(self) -> bool:
+        """Write all queued marks now. Returns False if some could not be written (they stay queued)."""
+        if not self._pending:
+            return True
+        batch, self._pending = self._pending, {}
+        groups: Dict[Tuple[Optional[str], Optional[str]], List[str]] = {}
+        for source_id, key in batch.items():
+            groups.setdefault(key, []).append(source_id)
+
+        written = set()
+        try:
+            for (loader_used, owner), ids in groups.items():
+                try:
+                    updated = await asyncio.to_thread(mark_sources_processed, ids, loader_used, owner)
+                    self.metrics["requests"] += 1
+                    written.update(ids)
+                    if updated < len(ids):
+                        # Leases that expired and were claimed elsewhere; the new holder marks them
+                        logger.warning(f"{len(ids) - updated} sources were not marked: their lease moved to another worker")
+                except Exception as e:
+                    self.metrics["errors"] += 1
+                    logger.warning(f"Failed to mark {len(ids)} sources processed, will retry: {e}")
+        finally:
+            # Requeue anything unconfirmed (also on cancellation) without overwriting newer marks
+            for source_id, key in batch.items():
+                if source_id not in written:
+                    self._pending.setdefault(source_id, key)
+                elif source_id not in self._pending:
+                    # Written; a source marked again meanwhile waits for that later write instead
+                    future = self._written.pop(source_id, None)
+                    if future is not None and not future.done():
+                        future.set_result(True)
+        self.metrics["marked"] += len(written)
+        self.metrics["flushes"] += 1
+        return len(written) == len(batch)
+
+    async def close(self):
+        """Flush everything still queued, then stop the background task"""
+        if self._cond is None:
+            return
+        self._closing = True
+        async with self._cond:
+            self._cond.notify_all()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        for attempt in range(STATUS_CLOSE_RETRIES):
+            if await self.flush():
+                break
+            await asyncio.sleep(min(STATUS_RETRY_MAX_DELAY, 2 ** attempt))
+        if self._pending:
+            # Embedded but unmarked: claimed again once their lease expires, and re-ingesting skips unchanged chunks
+            logger.error(
+                f"{len(self._pending)} processed sources could not be marked before shutdown: "
+                f"{list(self._pending)[:10]}"
+            )
+        for future in self._written.values():
+            if not future.done():
+                future.set_result(False)
+        self._written.clear()
+        # Allow reuse if the app is started again in the same process
+        self._cond = None
+        self._closing = False
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "pending": len(self._pending)}
+
+# Global instance
+status_writer = StatusWriter()
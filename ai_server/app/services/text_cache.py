@@ -0,0 +1,146 @@
+# app/services/text_cache.py
+import os
+import json
+import time
+import threading
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "./.text_cache")
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+class ExtractedTextCache:
+    """
+    Persistent cache of extracted source text on local disk.
+    Text files are content-addressed (named by the SHA-256 of the original file),
+    and an index maps each source id to its current digest. Entries are evicted
+    least-recently-used once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = TEXT_CACHE_DIR, max_bytes: int = TEXT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Dict]] = None
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # --- index helpers (call with the lock held) ---
+    def _load_index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as fh:
+                    self._index = json.load(fh)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self._index, fh)
+        os.replace(tmp, self._index_path)
+
+    def _text_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.txt")
+
+    def _remove_entry(self, source_id: str):
+        entry = self._index.pop(source_id, None)
+        if not entry:
+            return
+        # The text file may be shared by other sources with identical content
+        if not any(e["digest"] == entry["digest"] for e in self._index.values()):
+            try:
+                os.remove(self._text_path(entry["digest"]))
+            except OSError:
+                pass
+
+    def _evict(self):
+        by_digest = {}
+        for e in self._index.values():
+            by_digest[e["digest"]] = e["size"]
+        total = sum(by_digest.values())
+        if total <= self.max_bytes:
+            return
+        for source_id, _ in sorted(self._index.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            digest = self._index[source_id]["digest"]
+            self._remove_entry(source_id)
+            if digest not in {e["digest"] for e in self._index.values()}:
+                total -= by_digest.get(digest, 0)
+            self.metrics["evictions"] += 1
+
+    # --- public API ---
+    def put(self, source_id: str, digest: str, text: str, file_type: Optional[str] = None, etag: Optional[str] = None):
+        """Store extracted text for a source; replaces any previous version of that source"""
+        if not source_id or not digest:
+            return
+        with self._lock:
+            index = self._load_index()
+            path = self._text_path(digest)
+            if not os.path.exists(path):
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as fh:
+                    fh.write(text)
+                os.replace(tmp, path)
+
+            current = index.get(source_id)
+            if current and current["digest"] != digest:
+                self._remove_entry(source_id)
+            index[source_id] = {
+                "digest": digest,
+                "etag": etag,
+                "file_type": file_type,
+                "size": os.path.getsize(path),
+                "last_access": time.time(),
+            }
+            self._evict()
+            self._save_index()
+
+    def get(self, source_id: str, max_chars: Optional[int] = None) -> Optional[str]:
+        """Return cached text for a source (optionally only the first max_chars), or None"""
+        with self._lock:
+            entry = self._load_index().get(source_id)
+            if not entry:
+                self.metrics["misses"] += 1
+                return None
+            try:
+                with open(self._text_path(entry["digest"]), "r", encoding="utf-8") as fh:
+                    text = fh.read(max_chars) if max_chars else fh.read()
+            except OSError:
+                # Text file went missing; drop the stale index entry
+                self._index.pop(source_id, None)
+                self.metrics["misses"] += 1
+                return None
+            entry["last_access"] = time.time()
+            self.metrics["hits"] += 1
+            return text
+
+    def get_digest(self, source_id: str) -> Optional[str]:
+        with self._lock:
+            entry = self._load_index().get(source_id)
+            return entry["digest"] if entry else None
+
+    def invalidate(self, source_id: str):
+        with self._lock:
+            self._load_index()
+            self._remove_entry(source_id)
+            self._save_index()
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            index = self._load_index()
+            return {
+                **self.metrics,
+                "entries": len(index),
+                "bytes": sum({e["digest"]: e["size"] for e in index.values()}.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+# Global instance
+text_cache = ExtractedTextCache()
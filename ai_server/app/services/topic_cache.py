@@ -0,0 +1,58 @@
+# app/services/topic_cache.py
+import os
+import hashlib
+from typing import Dict, Iterable, Optional
+from app.services.cache import TTLCache, SQLiteCache
+
+TOPIC_CACHE_TTL = float(os.getenv("TOPIC_CACHE_TTL", str(24 * 3600)))
+TOPIC_CACHE_MAXSIZE = int(os.getenv("TOPIC_CACHE_MAXSIZE", "512"))
+# Optional on-disk backing, e.g. ./.cache/topics.sqlite3
+TOPIC_CACHE_DB = os.getenv("TOPIC_CACHE_DB")
+
+
+class TopicCache:
+    """
+    Memoizes extract_key_topics results per study kit.
+    The key includes the kit's processed source count and latest processedAt,
+    so a kit whose sources change never sees stale topics; IngestionManager
+    also drops a kit's entries as soon as new sources for it are processed.
+    """
+
+    def __init__(self, ttl: float = TOPIC_CACHE_TTL, maxsize: int = TOPIC_CACHE_MAXSIZE, db_path: Optional[str] = TOPIC_CACHE_DB):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._disk = SQLiteCache(db_path, namespace="topics") if db_path else None
+
+    @staticmethod
+    def _kit_prefix(studyKitId: Optional[str]) -> str:
+        return f"{studyKitId or '*'}|"
+
+    def make_key(self, studyKitId: Optional[str], k: int, provider: str, source_version: Iterable) -> str:
+        version_hash = hashlib.sha1("\n".join(str(v) for v in source_version).encode("utf-8")).hexdigest()
+        return f"{self._kit_prefix(studyKitId)}{k}|{provider}|{version_hash}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Dict):
+        self._memory.set(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value, ttl=self.ttl)
+
+    def invalidate_kit(self, studyKitId: Optional[str]):
+        # Topics over "all sources" depend on every kit, so drop those too
+        for prefix in {self._kit_prefix(studyKitId), self._kit_prefix(None)}:
+            self._memory.delete_prefix(prefix)
+            if self._disk is not None:
+                self._disk.delete_prefix(prefix)
+
+    def get_metrics(self) -> Dict:
+        return {**self._memory.get_metrics(), "disk": self._disk is not None}
+
+# Global instance
+topic_cache = TopicCache()
@@ -231,20 +231,36 @@
 
 # app/services/vectorstore.py
 import os
-from typing import List
+import time
+import uuid
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 load_dotenv()
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
+import chromadb
 from langchain.vectorstores import Chroma
 from langchain.schema import Document
+from app.services.embedding_cache import embedding_cache
+from app.services.file_lock import file_lock
+from app.services.lexical_index import lexical_index, DEFAULT_COLLECTION
+from app.services.embeddings import (
+    EmbeddingSpec, spec_for_collection, get_embeddings_for_spec
+)
+
+logger = logging.getLogger(__name__)
 
 # Chroma persistence directory (change or set CHROMA_PERSIST_DIR in env)
 CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", "./.chroma_db")
 
-EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
-DEFAULT_COLLECTION = os.getenv("VECTOR_COLLECTION", "study_resources")
+# "chroma" or "faiss" (in-process ANN index, see faiss_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# How often Chroma searches check whether another process wrote (reopening the client reloads its index)
+CHROMA_RELOAD_INTERVAL = float(os.getenv("CHROMA_RELOAD_INTERVAL", "5"))
 
 # --- chunking helpers (same behaviour as before) ---
 def chunk_splitter(text: str, metadata: dict, chunk_size: int = 1000, chunk_overlap: int = 200):
@@ -252,19 +268,378 @@ def chunk_splitter(text: str, metadata: dict, chunk_size: int = 1000, chunk_over
     docs = splitter.create_documents([text], metadatas=[metadata])
     return docs
 
+def make_chunk_id(source_id: str, chunk_index: int, chunk_hash: str) -> str:
+    """Deterministic chunk id: same source, position and content -> same id"""
+    return f"{source_id}:{chunk_index}:{chunk_hash[:16]}"
+
 def chunk_text_into_docs(text: str, metadata: dict, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
     """
     Split text into chunks and return a list of langchain Document objects.
+    When metadata carries a source_id, each chunk gets chunk_index, chunk_hash
+    and a deterministic chunk_id so re-ingestion can upsert and diff.
     """
-    return chunk_splitter(text, metadata, chunk_size, chunk_overlap)
+    docs = chunk_splitter(text, metadata, chunk_size, chunk_overlap)
+    source_id = (metadata or {}).get("source_id")
+    if source_id:
+        for i, d in enumerate(docs):
+            chunk_hash = hashlib.sha256(d.page_content.encode("utf-8")).hexdigest()
+            d.metadata["chunk_index"] = i
+            d.metadata["chunk_hash"] = chunk_hash
+            d.metadata["chunk_id"] = make_chunk_id(source_id, i, chunk_hash)
+    return docs
 
 # --- embeddings ---
-def get_embeddings(embedding_model: str = EMBED_MODEL):
+def get_embeddings(embedding_model: Optional[str] = None, collection_name: Optional[str] = None):
     """
-    Returns an embedding function instance.
+    Returns the shared embedding function for a collection (see COLLECTION_EMBEDDINGS),
+    or for an explicit model on the default backend.
     Requires OPENAI_API_KEY in env if using OpenAI.
     """
-    return OpenAIEmbeddings(model=embedding_model)
+    spec = spec_for_collection(collection_name)
+    if embedding_model:
+        spec = EmbeddingSpec(spec.backend, embedding_model)
+    return get_embeddings_for_spec(spec)
+
+# --- long-lived collection handles ---
+class _ReadWriteLock:
+    """Many concurrent readers or one writer"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class VectorStoreManager:
+    """
+    Opens one chromadb client per process and one Chroma handle per collection,
+    and hands them out for reuse. Searches take a shared lock, writes an
+    exclusive one per collection. With the faiss backend, searches skip the
+    lock: FaissVectorStore publishes immutable snapshots instead.
+
+    A chromadb client only sees its own process's writes, so Chroma writers
+    from all processes take turns on a LOCK file, bump WRITES afterwards, and
+    reopen the client first if another process wrote since. Searches make the
+    same check every CHROMA_RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self, persist_directory: str = CHROMA_DIR, backend: str = VECTOR_BACKEND):
+        self.persist_directory = persist_directory
+        self.backend = backend
+        self._client = None
+        self._stores: Dict[str, object] = {}
+        self._locks: Dict[str, _ReadWriteLock] = {}
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(persist_directory, "LOCK")
+        self._writes_path = os.path.join(persist_directory, "WRITES")
+        self._writes_seen = self._read_writes()
+        self._writes_checked_at = time.monotonic()
+        self._catch_up_lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = chromadb.PersistentClient(path=self.persist_directory)
+        return self._client
+
+    def _open(self, collection_name: str):
+        embedding_function = get_embeddings(collection_name=collection_name)
+        if self.backend == "faiss":
+            from app.services.faiss_store import FaissVectorStore
+            return FaissVectorStore(collection_name, embedding_function=embedding_function)
+        if self.backend != "chroma":
+            raise ValueError(f"Unsupported vector backend: {self.backend}")
+        return Chroma(
+            client=self._get_client(),
+            collection_name=collection_name,
+            embedding_function=embedding_function,
+        )
+
+    def get(self, collection_name: Optional[str] = None):
+        collection_name = collection_name or DEFAULT_COLLECTION
+        vs = self._stores.get(collection_name)
+        if vs is not None:
+            return vs
+        with self._lock:
+            vs = self._stores.get(collection_name)
+            if vs is None:
+                vs = self._open(collection_name)
+                self._stores[collection_name] = vs
+            return vs
+
+    def _rw_lock(self, collection_name: Optional[str]) -> _ReadWriteLock:
+        # Under the same lock as close(), which clears _locks
+        collection_name = collection_name or DEFAULT_COLLECTION
+        with self._lock:
+            lock = self._locks.get(collection_name)
+            if lock is None:
+                lock = self._locks[collection_name] = _ReadWriteLock()
+            return lock
+
+    @contextmanager
+    def reading(self, collection_name: Optional[str] = None):
+        if self.backend == "faiss":
+            yield self.get(collection_name)
+            return
+        self._maybe_catch_up()
+        with self._rw_lock(collection_name).read():
+            yield self.get(collection_name)
+
+    @contextmanager
+    def writing(self, collection_name: Optional[str] = None):
+        if self.backend != "chroma":
+            with self._rw_lock(collection_name).write():
+                yield self.get(collection_name)
+            return
+        with file_lock(self._lock_path):
+            self._catch_up()
+            with self._rw_lock(collection_name).write():
+                yield self.get(collection_name)
+                self._writes_seen = self._bump_writes()
+
+    # --- cross-process visibility (chroma) ---
+    def _read_writes(self) -> int:
+        try:
+            with open(self._writes_path, "r", encoding="utf-8") as fh:
+                return int(fh.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _bump_writes(self) -> int:
+        """Count a write (LOCK held); other processes compare the counter with the last one they saw"""
+        count = self._read_writes() + 1
+        tmp = self._writes_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(str(count))
+        os.replace(tmp, self._writes_path)
+        return count
+
+    def _maybe_catch_up(self):
+        if time.monotonic() - self._writes_checked_at < CHROMA_RELOAD_INTERVAL:
+            return
+        # One thread checks; the others keep searching the current handles
+        if not self._catch_up_lock.acquire(blocking=False):
+            return
+        try:
+            self._writes_checked_at = time.monotonic()
+            self._catch_up()
+        finally:
+            self._catch_up_lock.release()
+
+    def _catch_up(self):
+        """Reopen the client if another process wrote since this one last looked"""
+        count = self._read_writes()
+        if count != self._writes_seen:
+            self.close()
+            self._writes_seen = count
+
+    def close(self):
+        """Drop all handles; the PersistentClient writes through, so nothing is lost"""
+        with self._lock:
+            for name in list(self._stores):
+                lock = self._locks.get(name)
+                # Wait for readers and writers of the collection, if any were ever used
+                with lock.write() if lock is not None else nullcontext():
+                    vs = self._stores.pop(name, None)
+                    if self.backend == "faiss" and vs is not None:
+                        vs.close()
+            self._locks.clear()
+            if self._client is not None and hasattr(self._client, "clear_system_cache"):
+                self._client.clear_system_cache()
+            self._client = None
+
+# Global instance
+vectorstore_manager = VectorStoreManager()
+
+# --- embed / store stages (used separately by the ingestion pipeline) ---
+def embed_texts(
+    texts: List[str],
+    collection_name: Optional[str] = None,
+    on_call: Optional[Callable[[int], None]] = None
+) -> Tuple[List[List[float]], List[bool]]:
+    """
+    Embed texts with the collection's embedding backend, calling it only for
+    texts not already in the embedding cache. Returns (vectors, hit_flags).
+    Misses are sent in requests of at most the backend's chunk_size texts;
+    on_call(n_texts) is called once per request.
+    """
+    if not texts:
+        return [], []
+    spec = spec_for_collection(collection_name)
+
+    def embed(batch: List[str]) -> List[List[float]]:
+        emb = get_embeddings_for_spec(spec)
+        size = getattr(emb, "chunk_size", None) or len(batch)
+        vectors = []
+        for i in range(0, len(batch), size):
+            part = batch[i:i + size]
+            vectors.extend(emb.embed_documents(part))
+            if on_call is not None:
+                on_call(len(part))
+        return vectors
+
+    return embedding_cache.embed(spec.cache_key, texts, embed)
+
+def embed_documents_with_stats(documents: List[Document], collection_name: Optional[str] = None) -> Tuple[List[List[float]], Dict[str, int]]:
+    """
+    Embed the page_content of each document through the embedding cache.
+    Returns (vectors, {"hits", "misses"}).
+    """
+    vectors, hit_flags = embed_texts([d.page_content for d in documents], collection_name=collection_name)
+    hits = sum(hit_flags)
+    return vectors, {"hits": hits, "misses": len(hit_flags) - hits}
+
+def embed_documents(documents: List[Document], collection_name: Optional[str] = None) -> List[List[float]]:
+    """
+    Embed the page_content of each document. Blocking call on cache misses.
+    """
+    return embed_documents_with_stats(documents, collection_name=collection_name)[0]
+
+def _collection(vs):
+    # FaissVectorStore implements the chroma collection calls used here (upsert / get / delete)
+    return vs if vectorstore_manager.backend == "faiss" else vs._collection
+
+def _clean_metadata(metadata: dict) -> dict:
+    # Chroma rejects None metadata values
+    return {k: v for k, v in (metadata or {}).items() if v is not None}
+
+def store_embedded_documents(
+    documents: List[Document],
+    embeddings: List[List[float]],
+    collection_name: str = DEFAULT_COLLECTION,
+    persist: bool = True
+):
+    """
+    Write already-embedded documents into a collection.
+    """
+    # Callers may pass None for the default collection (e.g. IngestionManager())
+    collection_name = collection_name or DEFAULT_COLLECTION
+    if not documents:
+        return {"inserted": 0, "collection": collection_name}
+    if len(documents) != len(embeddings):
+        raise ValueError("documents and embeddings must have the same length")
+
+    ids = [d.metadata.get("chunk_id") or str(uuid.uuid4()) for d in documents]
+    metadatas = [_clean_metadata(d.metadata) for d in documents]
+    texts = [d.page_content for d in documents]
+    try:
+        with vectorstore_manager.writing(collection_name) as vs:
+            # upsert on deterministic ids makes repeated ingestion idempotent
+            _collection(vs).upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+        # persist is kept for API compatibility: both backends write through
+    except Exception as e:
+        raise RuntimeError(f"Failed to upsert documents to vector store ({vectorstore_manager.backend}): {e}")
+
+    try:
+        lexical_index.add(collection_name, ids, texts, metadatas)
+    except Exception as e:
+        # The vector store is the source of truth; scripts/build_lexical_index.py rebuilds this
+        logger.error(f"Failed to update lexical index for {collection_name}: {e}")
+    return {"inserted": len(documents), "collection": collection_name}
+
+# --- incremental re-ingestion ---
+def diff_source_documents(
+    source_id: str,
+    documents: List[Document],
+    collection_name: str = DEFAULT_COLLECTION
+) -> Tuple[List[Document], List[str], int]:
+    """
+    Compare freshly chunked documents with what the collection already holds for
+    source_id. Chunks are matched by content hash, so an edit only re-embeds the
+    chunks it changed. A chunk that only moved is written again under its stored
+    id so its chunk_index is current (its embedding comes from the cache).
+    Returns (documents_to_write, stale_ids_to_delete, unchanged_count).
+    """
+    with vectorstore_manager.reading(collection_name) as vs:
+        existing = _collection(vs).get(where={"source_id": source_id}, include=["metadatas"])
+
+    # chunk_hash -> (id, chunk_index) already stored with that content (a hash can repeat within a source)
+    stored: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+    for chunk_id, meta in zip(existing.get("ids") or [], existing.get("metadatas") or []):
+        meta = meta or {}
+        chunk_hash = meta.get("chunk_hash")
+        stored.setdefault(chunk_hash or f"legacy:{chunk_id}", []).append((chunk_id, meta.get("chunk_index")))
+
+    to_write = []
+    unchanged = 0
+    for d in documents:
+        entries = stored.get(d.metadata.get("chunk_hash"))
+        if not entries:
+            to_write.append(d)
+            continue
+        index = d.metadata.get("chunk_index")
+        # Prefer the copy already at this position
+        pos = next((i for i, (_, stored_index) in enumerate(entries) if stored_index == index), len(entries) - 1)
+        chunk_id, stored_index = entries.pop(pos)
+        if stored_index == index:
+            unchanged += 1
+        else:
+            d.metadata["chunk_id"] = chunk_id
+            to_write.append(d)
+
+    stale_ids = [chunk_id for entries in stored.values() for chunk_id, _ in entries]
+    return to_write, stale_ids, unchanged
+
+def delete_chunks(ids: List[str], collection_name: str = DEFAULT_COLLECTION) -> int:
+    collection_name = collection_name or DEFAULT_COLLECTION
+    if not ids:
+        return 0
+    with vectorstore_manager.writing(collection_name) as vs:
+        _collection(vs).delete(ids=ids)
+    try:
+        lexical_index.delete(collection_name, ids)
+    except Exception as e:
+        logger.error(f"Failed to delete chunks from lexical index for {collection_name}: {e}")
+    return len(ids)
+
+def get_documents(ids: List[str], collection_name: str = DEFAULT_COLLECTION) -> Dict[str, Document]:
+    """Stored chunks by id, as Documents (missing ids are left out)"""
+    if not ids:
+        return {}
+    with vectorstore_manager.reading(collection_name) as vs:
+        res = _collection(vs).get(ids=list(ids), include=["documents", "metadatas"])
+    return {
+        chunk_id: Document(page_content=text or "", metadata=meta or {})
+        for chunk_id, text, meta in zip(res.get("ids") or [], res.get("documents") or [], res.get("metadatas") or [])
+    }
+
+def iter_documents(collection_name: str = DEFAULT_COLLECTION, batch_size: int = 1000):
+    """Yield (ids, texts, metadatas) pages covering every chunk in the collection"""
+    offset = 0
+    while True:
+        with vectorstore_manager.reading(collection_name) as vs:
+            res = _collection(vs).get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        ids = res.get("ids") or []
+        if not ids:
+            return
+        yield ids, res.get("documents") or [], res.get("metadatas") or []
+        offset += len(ids)
 
 # --- upsert into Chroma ---
 def upsert_documents_to_chroma(documents: List[Document], collection_name: str = DEFAULT_COLLECTION, persist: bool = True):
@@ -278,45 +653,71 @@ def upsert_documents_to_chroma(documents: List[Document], collection_name: str =
         return {"inserted": 0, "collection": collection_name}
 
     try:
-        embedding_fn = get_embeddings()
-
-        # Create or load the Chroma vector store
-        vs = Chroma.from_documents(
-            documents=documents,
-            embedding=embedding_fn,
-            collection_name=collection_name,
-            persist_directory=CHROMA_DIR,
-            client_settings=None  # optional: pass chromadb.config.Settings if you want custom impl
-        )
-
-        if persist:
-            vs.persist()
-
-        return {"inserted": len(documents), "collection": collection_name}
+        embeddings = embed_documents(documents, collection_name=collection_name)
     except Exception as e:
-        raise RuntimeError(f"Failed to upsert documents to vector store (Chroma): {e}")
+        raise RuntimeError(f"Failed to embed documents: {e}")
+    return store_embedded_documents(documents, embeddings, collection_name=collection_name, persist=persist)
 
 # back-compat name
 def upsert_documents_to_vectorstore(documents: List[Document], collection_name: str = DEFAULT_COLLECTION):
     return upsert_documents_to_chroma(documents, collection_name=collection_name, persist=True)
 
+# --- metadata filters ---
+FILTER_FIELDS = ("studyKitId", "source_id", "file_type")
+
+def make_filter(studyKitId=None, source_id=None, file_type=None) -> Optional[Dict]:
+    """
+    Metadata filter for similarity_search / get_retriever, or None when nothing is set.
+    Each argument is a value or a list of values (match any).
+    """
+    values = {"studyKitId": studyKitId, "source_id": source_id, "file_type": file_type}
+    return {k: v for k, v in values.items() if v not in (None, "", [])} or None
+
+def _chroma_where(filter: Dict) -> Dict:
+    unknown = set(filter) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot filter on {', '.join(sorted(unknown))}; supported fields: {', '.join(FILTER_FIELDS)}")
+    clauses = [
+        {k: {"$in": list(v)}} if isinstance(v, (list, tuple, set)) else {k: v}
+        for k, v in filter.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _search_filter(filter: Optional[Dict]):
+    # Chroma applies its where clause inside the HNSW query; FaissVectorStore takes the plain dict
+    if not filter:
+        return None
+    return filter if vectorstore_manager.backend == "faiss" else _chroma_where(filter)
+
 # --- get a vectorstore instance (useful for queries) ---
 def get_vectorstore(collection_name: str = DEFAULT_COLLECTION):
     try:
-        return Chroma(
-            collection_name=collection_name,
-            embedding_function=get_embeddings(),
-            persist_directory=CHROMA_DIR,
-            client_settings=None
-        )
+        return vectorstore_manager.get(collection_name)
     except Exception as e:
-        raise RuntimeError(f"Failed to connect to Chroma vector store: {e}")
+        raise RuntimeError(f"Failed to connect to {vectorstore_manager.backend} vector store: {e}")
+
+def similarity_search(
+    query: str,
+    k: int = 4,
+    collection_name: str = DEFAULT_COLLECTION,
+    filter: Optional[Dict] = None
+) -> List[Document]:
+    """
+    Similarity search on a shared collection handle, safe alongside concurrent writes.
+    filter (see make_filter) is applied inside the index query, so a study kit's
+    search only scores that kit's chunks.
+    """
+    where = _search_filter(filter)
+    with vectorstore_manager.reading(collection_name) as vs:
+        if where is None:
+            return vs.similarity_search(query, k=k)
+        return vs.similarity_search(query, k=k, filter=where)
 
 # --- retriever similar to langchain's interface ---
-def get_retriever(collection_name: str = DEFAULT_COLLECTION, k: int = 5):
+def get_retriever(collection_name: str = DEFAULT_COLLECTION, k: int = 5, filter: Optional[Dict] = None):
     vs = get_vectorstore(collection_name)
-    return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
-
-
-
-
+    search_kwargs = {"k": k}
+    where = _search_filter(filter)
+    if where is not None:
+        search_kwargs["filter"] = where
+    return vs.as_retriever(search_type="similarity", search_kwargs=search_kwargs)
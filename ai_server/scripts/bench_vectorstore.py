@@ -0,0 +1,151 @@
+# scripts/bench_vectorstore.py
+"""
+Recall and latency of the FAISS store vs Chroma on the same corpus.
+
+    cd ai_server
+    python -m scripts.bench_vectorstore --n 50000 --dim 384 --queries 1000
+    python -m scripts.bench_vectorstore --embeddings corpus.npy   # real (N, dim) float32 embeddings
+
+Ground truth is an exact cosine top-k over the corpus. Latency is measured per
+single query through each store's public search call, metadata lookup included.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List
+import numpy as np
+
+
+def make_corpus(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    # Clustered data is closer to real embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    points = centers[rng.integers(0, clusters, size=n)] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    return points
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True).clip(min=1e-12)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    out = []
+    for start in range(0, len(queries), 256):
+        scores = queries[start:start + 256] @ corpus.T
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        out.append(np.take_along_axis(top, order, axis=1))
+    return np.vstack(out)
+
+
+def measure(search: Callable[[List[float]], List[int]], queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+    for q in queries[:10]:
+        search(q.tolist())  # warm caches / lazy loads
+    latencies, hits = [], 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(q.tolist())
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[:k]) & set(expected.tolist()))
+    lat = np.array(latencies) * 1000
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "qps": len(queries) / (lat.sum() / 1000),
+    }
+
+
+def bench_chroma(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, workdir: str, batch: int) -> Dict:
+    import chromadb
+
+    client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch):
+        rows = range(i, min(i + batch, len(corpus)))
+        collection.add(
+            ids=[str(r) for r in rows],
+            embeddings=corpus[i:i + batch].tolist(),
+            metadatas=[{"row": r} for r in rows],
+            documents=[f"chunk {r}" for r in rows],
+        )
+    build = time.perf_counter() - start
+
+    def search(q):
+        res = collection.query(query_embeddings=[q], n_results=k, include=["metadatas", "documents"])
+        return [int(i) for i in res["ids"][0]]
+
+    return {"build_s": build, **measure(search, queries, truth, k)}
+
+
+def bench_faiss(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, workdir: str, batch: int, index_type: str) -> Dict:
+    from app.services.faiss_store import FaissVectorStore
+
+    store = FaissVectorStore("bench", persist_directory=os.path.join(workdir, f"faiss-{index_type}"), index_type=index_type)
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch):
+        rows = range(i, min(i + batch, len(corpus)))
+        store.upsert(
+            ids=[str(r) for r in rows],
+            embeddings=corpus[i:i + batch].tolist(),
+            metadatas=[{"row": r} for r in rows],
+            documents=[f"chunk {r}" for r in rows],
+        )
+    store.flush()
+    build = time.perf_counter() - start
+    metrics = store.get_metrics()
+
+    def search(q):
+        return [d.metadata["row"] for d in store.similarity_search_by_vector(q, k=k)]
+
+    result = {"build_s": build, **measure(search, queries, truth, k), "index": metrics["kind"]}
+    store.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--embeddings", help=".npy file with real embeddings; the last --queries rows become queries")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=5000, help="vectors per write")
+    parser.add_argument("--backends", default="chroma,faiss-hnsw,faiss-ivfpq")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        data = normalize(np.load(args.embeddings))
+        corpus, queries = data[:-args.queries], data[-args.queries:]
+    else:
+        data = normalize(make_corpus(args.n + args.queries, args.dim, args.clusters, args.seed))
+        corpus, queries = data[:args.n], data[args.n:]
+    truth = exact_top_k(corpus, queries, args.k)
+    print(f"corpus={len(corpus)} dim={corpus.shape[1]} queries={len(queries)} k={args.k}")
+
+    workdir = tempfile.mkdtemp(prefix="vector-bench-")
+    try:
+        print(f"{'backend':<14}{'index':<8}{'build s':>9}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}{'qps':>9}")
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            if backend == "chroma":
+                r = {**bench_chroma(corpus, queries, truth, args.k, workdir, args.batch), "index": "hnsw"}
+            elif backend.startswith("faiss-"):
+                r = bench_faiss(corpus, queries, truth, args.k, workdir, args.batch, backend[len("faiss-"):])
+            else:
+                raise SystemExit(f"unknown backend {backend}")
+            print(
+                f"{backend:<14}{r['index']:<8}{r['build_s']:>9.1f}{r['recall']:>9.3f}"
+                f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['qps']:>9.0f}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
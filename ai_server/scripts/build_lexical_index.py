@@ -0,0 +1,27 @@
+# scripts/build_lexical_index.py
+"""
+(Re)build the BM25 index of a collection from what the vector store holds.
+Ingestion keeps the index current; this is for collections ingested before
+hybrid retrieval existed, or after LEXICAL_INDEX_DIR was lost.
+
+    cd ai_server
+    python -m scripts.build_lexical_index [collection]
+"""
+import sys
+from app.services.vectorstore import iter_documents, DEFAULT_COLLECTION
+from app.services.lexical_index import lexical_index
+
+
+def main():
+    collection_name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_COLLECTION
+    total = 0
+    for ids, texts, metadatas in iter_documents(collection_name):
+        lexical_index.add(collection_name, ids, texts, metadatas)
+        total += len(ids)
+        print(f"{collection_name}: indexed {total} chunks")
+    print(lexical_index.get_metrics())
+    lexical_index.close()
+
+
+if __name__ == "__main__":
+    main()
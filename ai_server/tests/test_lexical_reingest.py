@@ -0,0 +1,84 @@
+# tests/test_lexical_reingest.py
+import hashlib
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain")
+pytest.importorskip("chromadb")
+
+from langchain.schema import Document
+
+from app.services import vectorstore
+from app.services.lexical_index import LexicalIndex
+
+
+class _MemoryCollection:
+    """The collection calls vectorstore makes (upsert / get / delete), held in a dict"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        for chunk_id, meta in zip(ids, metadatas):
+            self.rows[chunk_id] = meta
+
+    def get(self, where=None, include=None, **kwargs):
+        ids = [i for i, m in self.rows.items() if m.get("source_id") == where["source_id"]]
+        return {"ids": ids, "metadatas": [self.rows[i] for i in ids]}
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.rows.pop(chunk_id, None)
+
+
+class _Manager:
+    backend = "faiss"
+
+    def __init__(self):
+        self.collection = _MemoryCollection()
+
+    @contextmanager
+    def reading(self, collection_name=None):
+        yield self.collection
+
+    writing = reading
+
+
+def _docs(source_id, texts):
+    docs = []
+    for i, text in enumerate(texts):
+        chunk_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        docs.append(Document(page_content=text, metadata={
+            "source_id": source_id,
+            "chunk_index": i,
+            "chunk_hash": chunk_hash,
+            "chunk_id": vectorstore.make_chunk_id(source_id, i, chunk_hash),
+        }))
+    return docs
+
+
+def _ingest(docs, collection_name):
+    # Same calls and collection_name as IngestionManager.process_single_source
+    to_write, stale_ids, _ = vectorstore.diff_source_documents("src", docs, collection_name=collection_name)
+    vectorstore.store_embedded_documents(to_write, [[0.0]] * len(to_write), collection_name=collection_name)
+    vectorstore.delete_chunks(stale_ids, collection_name=collection_name)
+    return stale_ids
+
+
+def test_reingest_removes_stale_chunks_from_lexical_index(tmp_path, monkeypatch):
+    index = LexicalIndex(str(tmp_path))
+    monkeypatch.setattr(vectorstore, "lexical_index", index)
+    monkeypatch.setattr(vectorstore, "vectorstore_manager", _Manager())
+    try:
+        # The global IngestionManager has collection_name=None
+        _ingest(_docs("src", ["photosynthesis in chloroplasts", "mitochondria make atp"]), None)
+        stale_ids = _ingest(_docs("src", ["osmosis across membranes", "mitochondria make atp"]), None)
+
+        assert stale_ids
+        hits = {chunk_id for chunk_id, _ in index.search(vectorstore.DEFAULT_COLLECTION, "photosynthesis chloroplasts", k=10)}
+        assert not hits & set(stale_ids)
+        assert {chunk_id for chunk_id, _ in index.search(None, "osmosis", k=10)}
+    finally:
+        index.close()
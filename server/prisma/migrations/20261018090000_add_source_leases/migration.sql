@@ -0,0 +1,56 @@
+-- AlterTable
+ALTER TABLE "public"."Source" ADD COLUMN     "leaseExpiresAt" TIMESTAMP(3),
+ADD COLUMN     "leaseOwner" TEXT;
+
+-- CreateIndex
+CREATE INDEX "Source_processed_leaseExpiresAt_idx" ON "public"."Source"("processed", "leaseExpiresAt");
+
+-- Lease functions used by the AI server's ingestion (called through Supabase RPC).
+-- Timestamps are UTC, like the rest of the Prisma-managed columns.
+
+-- Atomically lease up to p_limit unclaimed (or expired) sources to p_owner.
+-- SKIP LOCKED lets concurrent callers take disjoint rows without waiting on each other.
+CREATE OR REPLACE FUNCTION "public"."claim_sources"(
+    p_owner TEXT,
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_study_kit_id TEXT DEFAULT NULL,
+    p_include_processed BOOLEAN DEFAULT FALSE
+) RETURNS SETOF "public"."Source" LANGUAGE sql AS $$
+    UPDATE "public"."Source" AS s
+    SET "leaseOwner" = p_owner,
+        "leaseExpiresAt" = timezone('utc', now()) + make_interval(secs => p_lease_seconds)
+    WHERE s."id" IN (
+        SELECT c."id" FROM "public"."Source" AS c
+        WHERE (p_include_processed OR c."processed" = false)
+          AND (p_study_kit_id IS NULL OR c."studyKitId" = p_study_kit_id)
+          AND (c."leaseExpiresAt" IS NULL OR c."leaseExpiresAt" < timezone('utc', now()))
+        ORDER BY c."addedAt"
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING s.*;
+$$;
+
+-- Extend p_owner's leases; returns the ids it still holds.
+CREATE OR REPLACE FUNCTION "public"."renew_source_leases"(
+    p_owner TEXT,
+    p_ids TEXT[],
+    p_lease_seconds INTEGER
+) RETURNS SETOF TEXT LANGUAGE sql AS $$
+    UPDATE "public"."Source"
+    SET "leaseExpiresAt" = timezone('utc', now()) + make_interval(secs => p_lease_seconds)
+    WHERE "id" = ANY(p_ids) AND "leaseOwner" = p_owner
+    RETURNING "id";
+$$;
+
+-- Give up p_owner's leases so other workers can claim the rows right away.
+CREATE OR REPLACE FUNCTION "public"."release_source_leases"(
+    p_owner TEXT,
+    p_ids TEXT[]
+) RETURNS SETOF TEXT LANGUAGE sql AS $$
+    UPDATE "public"."Source"
+    SET "leaseOwner" = NULL, "leaseExpiresAt" = NULL
+    WHERE "id" = ANY(p_ids) AND "leaseOwner" = p_owner
+    RETURNING "id";
+$$;
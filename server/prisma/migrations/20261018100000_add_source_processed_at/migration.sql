@@ -0,0 +1,24 @@
+-- AlterTable
+ALTER TABLE "public"."Source" ADD COLUMN     "processedAt" TIMESTAMP(3);
+
+-- CreateIndex
+CREATE INDEX "Source_processedAt_idx" ON "public"."Source"("processedAt");
+
+-- Per-study-kit source counts for the AI server's /ingest/status (called through Supabase RPC).
+-- Aggregates server-side so the dashboard never downloads Source rows to count them.
+CREATE OR REPLACE FUNCTION "public"."source_counts_by_kit"(
+    p_study_kit_id TEXT DEFAULT NULL
+) RETURNS TABLE (
+    "studyKitId" TEXT,
+    "total" BIGINT,
+    "processed" BIGINT,
+    "in_progress" BIGINT
+) LANGUAGE sql STABLE AS $$
+    SELECT s."studyKitId",
+           count(*),
+           count(*) FILTER (WHERE s."processed"),
+           count(*) FILTER (WHERE NOT s."processed" AND s."leaseExpiresAt" > timezone('utc', now()))
+    FROM "public"."Source" AS s
+    WHERE p_study_kit_id IS NULL OR s."studyKitId" = p_study_kit_id
+    GROUP BY s."studyKitId";
+$$;
@@ -0,0 +1,36 @@
+-- claim_sources returns only the columns the AI server reads (SOURCE_COLUMNS in
+-- ai_server/app/db/supabase_client.py) instead of whole Source rows.
+-- The return type changes, so the function is dropped and recreated.
+DROP FUNCTION IF EXISTS "public"."claim_sources"(TEXT, INTEGER, INTEGER, TEXT, BOOLEAN);
+
+CREATE FUNCTION "public"."claim_sources"(
+    p_owner TEXT,
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_study_kit_id TEXT DEFAULT NULL,
+    p_include_processed BOOLEAN DEFAULT FALSE
+) RETURNS TABLE (
+    "id" TEXT,
+    "studyKitId" TEXT,
+    "fileUrl" TEXT,
+    "fileName" TEXT,
+    "fileType" TEXT,
+    "fileSize" INTEGER,
+    "processed" BOOLEAN,
+    "loaderUsed" TEXT
+) LANGUAGE sql AS $$
+    UPDATE "public"."Source" AS s
+    SET "leaseOwner" = p_owner,
+        "leaseExpiresAt" = timezone('utc', now()) + make_interval(secs => p_lease_seconds)
+    WHERE s."id" IN (
+        SELECT c."id" FROM "public"."Source" AS c
+        WHERE (p_include_processed OR c."processed" = false)
+          AND (p_study_kit_id IS NULL OR c."studyKitId" = p_study_kit_id)
+          AND (c."leaseExpiresAt" IS NULL OR c."leaseExpiresAt" < timezone('utc', now()))
+        ORDER BY c."addedAt"
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING s."id", s."studyKitId", s."fileUrl", s."fileName", s."fileType",
+              s."fileSize", s."processed", s."loaderUsed";
+$$;